@@ -0,0 +1,69 @@
+"""add locations
+
+Revision ID: 2b7e94d0c6f1
+Revises: 9c5d27e1f3a8
+Create Date: 2026-10-18 20:14:55.731260
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2b7e94d0c6f1'
+down_revision = '9c5d27e1f3a8'
+branch_labels = None
+depends_on = None
+
+
+def normalized(column):
+    # locations.normalize: collapsed whitespace, title case, empty is NULL
+    return f"nullif(initcap(btrim(regexp_replace({column}, '\\s+', ' ', 'g'))), '')"
+
+
+PLACE = "(coalesce(l.country, ''), coalesce(l.state, ''), coalesce(l.city, ''))"
+
+
+def upgrade():
+    op.create_table(
+        "locations",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("country", sa.String(), nullable=True),
+        sa.Column("state", sa.String(), nullable=True),
+        sa.Column("city", sa.String(), nullable=True),
+        sa.Column("latitude", sa.Float(), nullable=True),
+        sa.Column("longitude", sa.Float(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_locations_id"), "locations", ["id"], unique=False)
+    op.create_index("ix_locations_latitude_longitude", "locations", ["latitude", "longitude"])
+    op.create_index("ix_locations_place", "locations", [sa.text("coalesce(country, '')"), sa.text("coalesce(state, '')"), sa.text("coalesce(city, '')")], unique=True)
+
+    op.add_column("users", sa.Column("location_id", sa.Integer(), nullable=True))
+    op.create_foreign_key("users_location_id_fkey", "users", "locations", ["location_id"], ["id"])
+    op.execute(f"""
+        INSERT INTO locations (country, state, city)
+        SELECT DISTINCT {normalized('country')}, {normalized('state')}, {normalized('city')} FROM users
+        WHERE coalesce({normalized('country')}, {normalized('state')}, {normalized('city')}) IS NOT NULL
+    """)
+    op.execute(f"""
+        UPDATE users u SET location_id = l.id FROM locations l
+        WHERE {PLACE} = (coalesce({normalized('u.country')}, ''), coalesce({normalized('u.state')}, ''), coalesce({normalized('u.city')}, ''))
+    """)
+    op.create_index(op.f("ix_users_location_id"), "users", ["location_id"], unique=False)
+    op.drop_index("ix_users_country_city", table_name="users")
+    op.drop_column("users", "city")
+    op.drop_column("users", "state")
+    op.drop_column("users", "country")
+
+
+def downgrade():
+    op.add_column("users", sa.Column("country", sa.String(), nullable=True))
+    op.add_column("users", sa.Column("state", sa.String(), nullable=True))
+    op.add_column("users", sa.Column("city", sa.String(), nullable=True))
+    op.execute("UPDATE users u SET country = l.country, state = l.state, city = l.city FROM locations l WHERE l.id = u.location_id")
+    op.create_index("ix_users_country_city", "users", ["country", "city"])
+    op.drop_index(op.f("ix_users_location_id"), table_name="users")
+    op.drop_constraint("users_location_id_fkey", "users", type_="foreignkey")
+    op.drop_column("users", "location_id")
+    op.drop_table("locations")
@@ -0,0 +1,36 @@
+"""add search indexes
+
+Revision ID: 3b1f0c9a7d42
+Revises: 8e2defc6edd9
+Create Date: 2026-10-18 10:12:31.402118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b1f0c9a7d42'
+down_revision = '8e2defc6edd9'
+branch_labels = None
+depends_on = None
+
+
+# CONCURRENTLY keeps writes to these tables going while the indexes build,
+# it cannot run inside the migration's transaction
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index("ix_users_country_city", "users", ["country", "city"], postgresql_concurrently=True)
+        op.create_index("ix_pets_species_sex_birth_date", "pets", ["species", "sex", "birth_date"], postgresql_concurrently=True)
+        op.create_index("ix_pets_has_home_species", "pets", ["has_home", "species"], postgresql_concurrently=True)
+        op.create_index("ix_posts_owner_id_time", "posts", ["owner_id", "time"], postgresql_concurrently=True)
+        op.create_index("ix_comments_post_id", "comments", ["post_id"], postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_comments_post_id", table_name="comments", postgresql_concurrently=True)
+        op.drop_index("ix_posts_owner_id_time", table_name="posts", postgresql_concurrently=True)
+        op.drop_index("ix_pets_has_home_species", table_name="pets", postgresql_concurrently=True)
+        op.drop_index("ix_pets_species_sex_birth_date", table_name="pets", postgresql_concurrently=True)
+        op.drop_index("ix_users_country_city", table_name="users", postgresql_concurrently=True)
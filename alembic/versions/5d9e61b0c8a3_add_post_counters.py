@@ -0,0 +1,36 @@
+"""add post counters
+
+Revision ID: 5d9e61b0c8a3
+Revises: a7c4e2d913f5
+Create Date: 2026-10-18 12:20:44.530912
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d9e61b0c8a3'
+down_revision = 'a7c4e2d913f5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("posts", sa.Column("likes_count", sa.Integer(), server_default="0", nullable=False))
+    op.add_column("posts", sa.Column("comments_count", sa.Integer(), server_default="0", nullable=False))
+    op.execute("""
+        UPDATE posts SET likes_count = l.count
+        FROM (SELECT post_id, count(*) AS count FROM likes GROUP BY post_id) l
+        WHERE l.post_id = posts.id
+    """)
+    op.execute("""
+        UPDATE posts SET comments_count = c.count
+        FROM (SELECT post_id, count(*) AS count FROM comments GROUP BY post_id) c
+        WHERE c.post_id = posts.id
+    """)
+
+
+def downgrade():
+    op.drop_column("posts", "comments_count")
+    op.drop_column("posts", "likes_count")
@@ -0,0 +1,39 @@
+"""add feed items
+
+Revision ID: 6f3a8d2c41e9
+Revises: 2b7e94d0c6f1
+Create Date: 2026-10-18 21:02:37.418806
+
+Feeds start empty: run `python src/manage.py rebuild-feeds` after upgrading.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6f3a8d2c41e9'
+down_revision = '2b7e94d0c6f1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "feed_items",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("post_id", sa.Integer(), nullable=False),
+        sa.Column("time", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["post_id"], ["posts.id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("user_id", "post_id"),
+    )
+    op.create_index(op.f("ix_feed_items_post_id"), "feed_items", ["post_id"])
+    op.create_index("ix_feed_items_user_id_time_post_id", "feed_items", ["user_id", "time", "post_id"])
+    op.add_column("pets", sa.Column("feed_on_read", sa.Boolean(), server_default="f", nullable=False))
+
+
+def downgrade():
+    op.drop_column("pets", "feed_on_read")
+    op.drop_index("ix_feed_items_user_id_time_post_id", table_name="feed_items")
+    op.drop_index(op.f("ix_feed_items_post_id"), table_name="feed_items")
+    op.drop_table("feed_items")
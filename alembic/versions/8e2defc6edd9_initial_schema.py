@@ -0,0 +1,136 @@
+"""initial schema
+
+Revision ID: 8e2defc6edd9
+Revises: 
+Create Date: 2022-03-19 21:41:14.214905
+
+Databases created by create_all before migrations were complete match this
+revision: run `alembic stamp 8e2defc6edd9` once on them, then upgrade.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '8e2defc6edd9'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("email", sa.String(), nullable=True),
+        sa.Column("username", sa.String(), nullable=True),
+        sa.Column("hashed_password", sa.String(), nullable=True),
+        sa.Column("phone", sa.String(), nullable=True),
+        sa.Column("country", sa.String(), nullable=True),
+        sa.Column("state", sa.String(), nullable=True),
+        sa.Column("city", sa.String(), nullable=True),
+        sa.Column("address", sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_users_email"), "users", ["email"], unique=True)
+    op.create_index(op.f("ix_users_username"), "users", ["username"], unique=True)
+    op.create_index(op.f("ix_users_id"), "users", ["id"], unique=False)
+
+    op.create_table(
+        "pets",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(), nullable=True),
+        sa.Column("description", sa.String(), nullable=True),
+        sa.Column("sex", sa.String(), nullable=True),
+        sa.Column("species", sa.String(), nullable=True),
+        sa.Column("birth_date", sa.Date(), nullable=True),
+        sa.Column("image", sa.String(), nullable=True),
+        sa.Column("has_home", sa.Boolean(), server_default="t", nullable=True),
+        sa.Column("owner_id", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["owner_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_pets_birth_date"), "pets", ["birth_date"], unique=False)
+    op.create_index(op.f("ix_pets_id"), "pets", ["id"], unique=False)
+    op.create_index(op.f("ix_pets_name"), "pets", ["name"], unique=False)
+    op.create_index(op.f("ix_pets_sex"), "pets", ["sex"], unique=False)
+    op.create_index(op.f("ix_pets_species"), "pets", ["species"], unique=False)
+
+    op.create_table(
+        "posts",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("text", sa.String(), nullable=True),
+        sa.Column("owner_id", sa.Integer(), nullable=True),
+        sa.Column("images", postgresql.ARRAY(sa.String()), nullable=True),
+        sa.Column("time", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["owner_id"], ["pets.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_posts_id"), "posts", ["id"], unique=False)
+    op.create_index(op.f("ix_posts_text"), "posts", ["text"], unique=False)
+
+    op.create_table(
+        "comments",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("text", sa.String(), nullable=True),
+        sa.Column("post_id", sa.Integer(), nullable=True),
+        sa.Column("owner_id", sa.Integer(), nullable=True),
+        sa.Column("time", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["owner_id"], ["users.id"]),
+        sa.ForeignKeyConstraint(["post_id"], ["posts.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_comments_id"), "comments", ["id"], unique=False)
+    op.create_index(op.f("ix_comments_text"), "comments", ["text"], unique=False)
+
+    op.create_table(
+        "likes",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("post_id", sa.Integer(), nullable=True),
+        sa.Column("owner_id", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["owner_id"], ["users.id"]),
+        sa.ForeignKeyConstraint(["post_id"], ["posts.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("post_id", "owner_id", name="post_owner_key"),
+    )
+    op.create_index(op.f("ix_likes_id"), "likes", ["id"], unique=False)
+
+    op.create_table(
+        "transfers",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("pet_id", sa.Integer(), nullable=True),
+        sa.Column("owner_id", sa.Integer(), nullable=True),
+        sa.Column("applicant_id", sa.Integer(), nullable=True),
+        sa.Column("time", sa.DateTime(), nullable=True),
+        sa.Column("status", postgresql.ENUM("waiting", "rejected", "cancelled", "approved", "finished", name="transferstatusenum"), nullable=False),
+        sa.ForeignKeyConstraint(["applicant_id"], ["users.id"]),
+        sa.ForeignKeyConstraint(["owner_id"], ["users.id"]),
+        sa.ForeignKeyConstraint(["pet_id"], ["pets.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("pet_id"),
+    )
+    op.create_index(op.f("ix_transfers_id"), "transfers", ["id"], unique=False)
+
+    op.create_table(
+        "shelters",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.Column("pet_id", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["pet_id"], ["pets.id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("user_id"),
+    )
+    op.create_index(op.f("ix_shelters_id"), "shelters", ["id"], unique=False)
+
+
+def downgrade():
+    op.drop_table("shelters")
+    op.drop_table("transfers")
+    postgresql.ENUM(name="transferstatusenum").drop(op.get_bind())
+    op.drop_table("likes")
+    op.drop_table("comments")
+    op.drop_table("posts")
+    op.drop_table("pets")
+    op.drop_table("users")
@@ -0,0 +1,44 @@
+"""add full text search
+
+Revision ID: 9c5d27e1f3a8
+Revises: f4a9c3e27b10
+Create Date: 2026-10-18 18:47:12.508391
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '9c5d27e1f3a8'
+down_revision = 'f4a9c3e27b10'
+branch_labels = None
+depends_on = None
+
+
+PET_SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(name, '') || ' ' || coalesce(species, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B')"
+)
+POST_SEARCH_VECTOR = "to_tsvector('english', coalesce(text, ''))"
+
+
+def upgrade():
+    # stored generated columns rewrite the tables once
+    op.add_column("pets", sa.Column("search_vector", postgresql.TSVECTOR(), sa.Computed(PET_SEARCH_VECTOR, persisted=True), nullable=True))
+    op.add_column("posts", sa.Column("search_vector", postgresql.TSVECTOR(), sa.Computed(POST_SEARCH_VECTOR, persisted=True), nullable=True))
+    with op.get_context().autocommit_block():
+        op.create_index("ix_pets_search_vector", "pets", ["search_vector"], postgresql_using="gin", postgresql_concurrently=True)
+        op.create_index("ix_posts_search_vector", "posts", ["search_vector"], postgresql_using="gin", postgresql_concurrently=True)
+        # a B-tree over free text never served a query
+        op.drop_index("ix_posts_text", table_name="posts", postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.create_index("ix_posts_text", "posts", ["text"], postgresql_concurrently=True)
+        op.drop_index("ix_posts_search_vector", table_name="posts", postgresql_concurrently=True)
+        op.drop_index("ix_pets_search_vector", table_name="pets", postgresql_concurrently=True)
+    op.drop_column("posts", "search_vector")
+    op.drop_column("pets", "search_vector")
@@ -0,0 +1,39 @@
+"""add keyset pagination indexes
+
+Revision ID: a7c4e2d913f5
+Revises: 3b1f0c9a7d42
+Create Date: 2026-10-18 11:03:57.118406
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c4e2d913f5'
+down_revision = '3b1f0c9a7d42'
+branch_labels = None
+depends_on = None
+
+
+# CONCURRENTLY keeps writes to posts and comments going while the indexes
+# build, it cannot run inside the migration's transaction. The new indexes
+# exist before the ones they replace go.
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index("ix_posts_time_id", "posts", ["time", "id"], postgresql_concurrently=True)
+        op.create_index("ix_posts_owner_id_time_id", "posts", ["owner_id", "time", "id"], postgresql_concurrently=True)
+        op.drop_index("ix_posts_owner_id_time", table_name="posts", postgresql_concurrently=True)
+        op.create_index("ix_comments_time_id", "comments", ["time", "id"], postgresql_concurrently=True)
+        op.create_index("ix_comments_post_id_time_id", "comments", ["post_id", "time", "id"], postgresql_concurrently=True)
+        op.drop_index("ix_comments_post_id", table_name="comments", postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.create_index("ix_comments_post_id", "comments", ["post_id"], postgresql_concurrently=True)
+        op.drop_index("ix_comments_post_id_time_id", table_name="comments", postgresql_concurrently=True)
+        op.drop_index("ix_comments_time_id", table_name="comments", postgresql_concurrently=True)
+        op.create_index("ix_posts_owner_id_time", "posts", ["owner_id", "time"], postgresql_concurrently=True)
+        op.drop_index("ix_posts_owner_id_time_id", table_name="posts", postgresql_concurrently=True)
+        op.drop_index("ix_posts_time_id", table_name="posts", postgresql_concurrently=True)
@@ -0,0 +1,27 @@
+"""add image variants
+
+Revision ID: c2f8a05e7b16
+Revises: 5d9e61b0c8a3
+Create Date: 2026-10-18 13:41:09.287614
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2f8a05e7b16'
+down_revision = '5d9e61b0c8a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("pets", sa.Column("image_variants", postgresql.JSONB(), nullable=True))
+    op.add_column("posts", sa.Column("image_variants", postgresql.JSONB(), nullable=True))
+
+
+def downgrade():
+    op.drop_column("posts", "image_variants")
+    op.drop_column("pets", "image_variants")
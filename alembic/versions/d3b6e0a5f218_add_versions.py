@@ -0,0 +1,29 @@
+"""add versions
+
+Revision ID: d3b6e0a5f218
+Revises: 6f3a8d2c41e9
+Create Date: 2026-10-18 21:47:12.905364
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3b6e0a5f218'
+down_revision = '6f3a8d2c41e9'
+branch_labels = None
+depends_on = None
+
+
+# a constant default keeps these ALTERs from rewriting the tables
+def upgrade():
+    op.add_column("users", sa.Column("version", sa.Integer(), server_default="1", nullable=False))
+    op.add_column("pets", sa.Column("version", sa.Integer(), server_default="1", nullable=False))
+    op.add_column("posts", sa.Column("version", sa.Integer(), server_default="1", nullable=False))
+
+
+def downgrade():
+    op.drop_column("posts", "version")
+    op.drop_column("pets", "version")
+    op.drop_column("users", "version")
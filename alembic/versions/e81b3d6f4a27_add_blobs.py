@@ -0,0 +1,39 @@
+"""add blobs
+
+Revision ID: e81b3d6f4a27
+Revises: c2f8a05e7b16
+Create Date: 2026-10-18 15:02:18.664350
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e81b3d6f4a27'
+down_revision = 'c2f8a05e7b16'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "blobs",
+        sa.Column("path", sa.String(), nullable=False),
+        sa.Column("refcount", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("path"),
+    )
+    # files uploaded before content addressing become blobs with their current references
+    op.execute("""
+        INSERT INTO blobs (path, refcount)
+        SELECT path, count(*) FROM (
+            SELECT image AS path FROM pets WHERE image IS NOT NULL
+            UNION ALL
+            SELECT unnest(images) FROM posts
+        ) refs
+        GROUP BY path
+    """)
+
+
+def downgrade():
+    op.drop_table("blobs")
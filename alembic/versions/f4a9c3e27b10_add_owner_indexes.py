@@ -0,0 +1,32 @@
+"""add owner indexes
+
+Revision ID: f4a9c3e27b10
+Revises: e81b3d6f4a27
+Create Date: 2026-10-18 17:25:40.913527
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4a9c3e27b10'
+down_revision = 'e81b3d6f4a27'
+branch_labels = None
+depends_on = None
+
+
+# likes.post_id, comments.post_id, posts.owner_id and posts.time are covered
+# by post_owner_key and the keyset indexes already; these are the lookups by
+# owner: the liked feed and the pets of a user.
+def upgrade():
+    # CONCURRENTLY cannot run inside the migration's transaction
+    with op.get_context().autocommit_block():
+        op.create_index("ix_likes_owner_id_post_id", "likes", ["owner_id", "post_id"], postgresql_concurrently=True)
+        op.create_index(op.f("ix_pets_owner_id"), "pets", ["owner_id"], postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(op.f("ix_pets_owner_id"), table_name="pets", postgresql_concurrently=True)
+        op.drop_index("ix_likes_owner_id_post_id", table_name="likes", postgresql_concurrently=True)
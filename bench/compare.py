@@ -0,0 +1,33 @@
+"""Compares two bench/run.py results.
+
+    python bench/compare.py before.json after.json
+"""
+import json
+import sys
+
+METRICS = ('throughput', 'p50_ms', 'p95_ms', 'p99_ms', 'errors')
+
+
+def change(before, after):
+    if before in (None, 0) or after is None:
+        return ''
+    return f'{(after - before) / before * 100:+7.1f}%'
+
+
+def main(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f"{before.get('commit', '?')[:10]} -> {after.get('commit', '?')[:10]}")
+    for name in sorted(set(before['workloads']) | set(after['workloads'])):
+        old, new = before['workloads'].get(name, {}), after['workloads'].get(name, {})
+        print(name)
+        for metric in METRICS:
+            a, b = old.get(metric), new.get(metric)
+            fmt = lambda v: '-' if v is None else f'{v:10.2f}'
+            print(f'  {metric:12} {fmt(a)} {fmt(b)} {change(a, b)}')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:3])
@@ -0,0 +1,55 @@
+"""Feed throughput with a growing number of concurrent clients.
+
+Compares the sync crud functions called straight from a coroutine (what the
+async routes used to do) with the aio wrappers on the asyncpg engine:
+
+    POSTGRES_DATABASE_URL=... python bench/concurrency.py --clients 1 4 16 64
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from database import SessionLocal, AsyncSessionLocal, async_engine
+import aio, crud
+
+
+async def sync_client(requests: int, limit: int):
+    for i in range(requests):
+        db = SessionLocal()
+        try:
+            crud.get_posts(db=db, offset=i * limit, limit=limit)
+        finally:
+            db.close()
+
+
+async def async_client(requests: int, limit: int):
+    for i in range(requests):
+        async with AsyncSessionLocal() as db:
+            await aio.crud.get_posts(db=db, offset=i * limit, limit=limit)
+
+
+async def measure(client, clients: int, requests: int, limit: int):
+    started = time.perf_counter()
+    await asyncio.gather(*[client(requests, limit) for _ in range(clients)])
+    return clients * requests / (time.perf_counter() - started)
+
+
+async def main(clients: list, requests: int, limit: int):
+    for n in clients:
+        blocking = await measure(sync_client, n, requests, limit)
+        non_blocking = await measure(async_client, n, requests, limit)
+        print(f'clients={n:4} sync={blocking:8.1f} req/s async={non_blocking:8.1f} req/s')
+    await async_engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.clients, args.requests, args.limit))
@@ -0,0 +1,47 @@
+"""Variant rendering throughput in images/sec per core.
+
+    python bench/derivatives.py --images 200 --workers 1 2 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from PIL import Image
+import derivatives
+
+
+def make_sources(directory: str, count: int, size: tuple):
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f'source{i}.jpg')
+        Image.effect_mandelbrot(size, (-2.0 - i * 0.001, -1.5, 1.0, 1.5), 100).convert('RGB').save(path, quality=90)
+        paths.append('/' + path.lstrip('/'))
+    return paths
+
+
+def main(count: int, workers: list, size: tuple):
+    with tempfile.TemporaryDirectory() as directory:
+        # make_variants takes public paths relative to the working directory
+        os.chdir('/')
+        paths = make_sources(directory, count, size)
+        for n in workers:
+            with ProcessPoolExecutor(max_workers=n) as pool:
+                started = time.perf_counter()
+                list(pool.map(derivatives.make_variants, paths))
+                rate = count / (time.perf_counter() - started)
+            print(f'workers={n:3} {rate:8.1f} images/s {rate / n:8.1f} images/s/core')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--images', type=int, default=100)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count() or 1])
+    parser.add_argument('--width', type=int, default=3024)
+    parser.add_argument('--height', type=int, default=4032)
+    args = parser.parse_args()
+    main(args.images, args.workers, (args.width, args.height))
@@ -0,0 +1,54 @@
+"""Per-request overhead of MetricsMiddleware.
+
+Calls a trivial ASGI app directly and through the middleware, the
+difference is what the instrumentation costs every request:
+
+    python bench/metrics.py --requests 50000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import metrics
+
+
+class Route:
+    path = '/posts/{post_id}'
+
+
+async def endpoint(scope, receive, send):
+    scope['route'] = Route
+    await send({'type': 'http.response.start', 'status': 200, 'headers': [(b'content-type', b'application/json')]})
+    await send({'type': 'http.response.body', 'body': b'{"ok":true}'})
+
+
+async def receive():
+    return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+
+async def send(message):
+    pass
+
+
+async def measure(app, requests: int):
+    started = time.perf_counter()
+    for _ in range(requests):
+        await app({'type': 'http', 'method': 'GET', 'path': '/posts/1', 'headers': []}, receive, send)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+async def main(requests: int):
+    bare = await measure(endpoint, requests)
+    instrumented = await measure(metrics.MetricsMiddleware(endpoint), requests)
+    print(f'bare={bare:.2f}us instrumented={instrumented:.2f}us overhead={instrumented - bare:.2f}us/request')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=20000)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests))
@@ -0,0 +1,95 @@
+"""Password hashing cost and its effect on the rest of the API.
+
+Hashes per second with the configured PASSWORD_* cost, on one thread and on
+the whole pool:
+
+    python bench/passwords.py hashing
+
+Login throughput against a running API seeded with bench/seed.py, and the
+latency of a non-auth route before and during a login storm:
+
+    python bench/passwords.py storm --url http://localhost:8080 --logins 64
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import passwords
+
+
+def hashing(args):
+    hashed = passwords.hash('password')
+    results = {'time_cost': passwords.TIME_COST, 'memory_cost': passwords.MEMORY_COST, 'parallelism': passwords.PARALLELISM}
+    for threads in sorted({1, passwords.WORKERS}):
+        with ThreadPoolExecutor(threads) as pool:
+            started = time.perf_counter()
+            list(pool.map(lambda _: passwords.verify(hashed, 'password'), range(args.runs * threads)))
+            elapsed = time.perf_counter() - started
+        results[f'verify_per_second_{threads}_threads'] = args.runs * threads / elapsed
+    results['verify_per_second_per_core'] = results['verify_per_second_1_threads']
+    print(json.dumps(results, indent=2))
+
+
+async def probe(client, path, duration):
+    latencies = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        (await client.get(path)).raise_for_status()
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return {'requests': len(latencies), 'p50_ms': statistics.median(latencies), 'p99_ms': latencies[int(len(latencies) * .99)]}
+
+
+async def storm(args):
+    import httpx
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=60) as client:
+        # first logins of seeded users upgrade their legacy hashes, do them outside the measurement
+        await asyncio.gather(*[client.post('/auth/login', json={'username': f'user{i + 1}', 'password': 'password'}) for i in range(args.logins)])
+
+        baseline = await probe(client, args.probe, args.duration)
+
+        logins = 0
+        stop = time.perf_counter() + args.duration
+
+        async def login_loop(i):
+            nonlocal logins
+            while time.perf_counter() < stop:
+                response = await client.post('/auth/login', json={'username': f'user{i + 1}', 'password': 'password'})
+                response.raise_for_status()
+                logins += 1
+
+        during, *_ = await asyncio.gather(probe(client, args.probe, args.duration), *[login_loop(i) for i in range(args.logins)])
+
+    print(json.dumps({
+        'probe': args.probe,
+        'concurrent_logins': args.logins,
+        'logins_per_second': logins / args.duration,
+        'probe_baseline': baseline,
+        'probe_during_storm': during,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest='command', required=True)
+    hashing_parser = commands.add_parser('hashing')
+    hashing_parser.add_argument('--runs', type=int, default=20)
+    storm_parser = commands.add_parser('storm')
+    storm_parser.add_argument('--url', default='http://localhost:8080')
+    storm_parser.add_argument('--logins', type=int, default=64, help='concurrent login loops')
+    storm_parser.add_argument('--duration', type=float, default=20)
+    storm_parser.add_argument('--probe', default='/pets/1', help='non-auth route whose latency is watched')
+    args = parser.parse_args()
+    if args.command == 'hashing':
+        hashing(args)
+    else:
+        asyncio.run(storm(args))
@@ -0,0 +1,64 @@
+"""CPU time and memory of reading a feed page as ORM objects vs column rows.
+
+Run against a database filled by bench/seed.py:
+
+    POSTGRES_DATABASE_URL=... python bench/readpaths.py --limit 100 --runs 200
+
+"orm" hydrates Post objects and serializes them with a per-row loop over
+__table__.columns, as the read paths did before; "rows" is crud.get_posts.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from database import SessionLocal
+import crud, feed, models
+
+
+def orm(db, limit):
+    posts = db.query(models.Post, models.Pet.name.label('name'), models.Pet.image.label('avatar'), *feed.post_stats(1)).join(models.Pet, models.Pet.id == models.Post.owner_id).order_by(models.Post.time.desc(), models.Post.id.desc()).limit(limit).all()
+    page = []
+    for post in posts:
+        post_dict = {c.name: getattr(post[0], c.name) for c in post[0].__table__.columns}
+        post_dict['name'] = post.name
+        post_dict['avatar'] = post.avatar
+        post_dict['liked'] = bool(post.liked)
+        page.append(post_dict)
+    return feed.attach_comments(db, page)
+
+
+def rows(db, limit):
+    return crud.get_posts(db, limit=limit, user_id=1)
+
+
+def measure(fn, limit, runs):
+    cpu, peaks = [], []
+    for _ in range(runs):
+        db = SessionLocal()
+        try:
+            tracemalloc.start()
+            started = time.process_time()
+            fn(db, limit)
+            cpu.append((time.process_time() - started) * 1000)
+            peaks.append(tracemalloc.get_traced_memory()[1] / 1024)
+            tracemalloc.stop()
+        finally:
+            db.close()
+    return {'cpu_p50_ms': statistics.median(cpu), 'peak_kib_p50': statistics.median(peaks)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--limit', type=int, default=100)
+    parser.add_argument('--runs', type=int, default=200)
+    args = parser.parse_args()
+    # warm up connections and compiled statement caches
+    measure(orm, args.limit, 5)
+    measure(rows, args.limit, 5)
+    print(json.dumps({'limit': args.limit, 'orm': measure(orm, args.limit, args.runs), 'rows': measure(rows, args.limit, args.runs)}, indent=2))
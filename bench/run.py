@@ -0,0 +1,186 @@
+"""Scripted HTTP workloads against a running API, results as JSON.
+
+Seed the database with bench/seed.py (same arguments every time), start the
+API, then:
+
+    python bench/run.py --url http://localhost:8080 --duration 30 --clients 16 > before.json
+    ...
+    python bench/compare.py before.json after.json
+
+Requests are drawn from a seeded random generator, so two runs with the same
+arguments send the same request mix.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import httpx
+
+JPEG = bytes.fromhex('ffd8ffe000104a46494600010100000100010000ffdb004300') + bytes(64) + bytes.fromhex('ffd9')
+
+
+def feed(client, rng, ctx):
+    return client.get('/posts', params={'limit': 20, 'offset': rng.randrange(0, 200)})
+
+
+def feed_deep(client, rng, ctx):
+    return client.get('/posts', params={'limit': 20, 'offset': rng.randrange(0, 100000)})
+
+
+def home_feed(client, rng, ctx):
+    return client.get('/posts/feed', params={'limit': 20}, headers=ctx['auth'])
+
+
+def search(client, rng, ctx):
+    params = rng.choice([
+        {'species': 'dog'},
+        {'species': 'cat', 'sex': 'female'},
+        {'species': 'dog', 'has_home': 'false'},
+        {'country': 'Ukraine', 'city': 'Kyiv'},
+        {'near': '50.45,30.52', 'radius_km': 30},
+        {'species': 'dog', 'sex': 'male', 'gte_date': '2018-01-01', 'country': 'Poland'},
+    ])
+    return client.get('/search', params={'limit': 20, **params})
+
+
+def pet_posts(client, rng, ctx):
+    # the skew of the dataset puts most posts on low pet ids
+    return client.get(f'/pets/{int(rng.paretovariate(1.2)) % ctx["pets"] + 1}/posts', params={'limit': 20})
+
+
+def post(client, rng, ctx):
+    return client.get(f'/posts/{int(rng.paretovariate(1.1)) % ctx["posts"] + 1}', headers=ctx['auth'])
+
+
+async def batch(client, rng, ctx):
+    # what a screen showing 20 posts loads in three requests instead of sixty
+    post_ids = ','.join(str(int(rng.paretovariate(1.1)) % ctx['posts'] + 1) for _ in range(20))
+    pet_ids = ','.join(str(int(rng.paretovariate(1.2)) % ctx['pets'] + 1) for _ in range(20))
+    await client.get('/posts', params={'ids': post_ids}, headers=ctx['auth'])
+    await client.get('/pets', params={'ids': pet_ids})
+    return await client.get('/posts/likes', params={'ids': post_ids}, headers=ctx['auth'])
+
+
+async def poll(client, rng, ctx):
+    # a client revalidating what it already has, mostly answered with 304
+    path = rng.choice(['/posts?limit=20', f'/posts/{rng.randrange(1, 50)}', f'/pets/{rng.randrange(1, 50)}', f'/users/{rng.randrange(1, 50)}'])
+    etag = ctx['etags'].get(path)
+    response = await client.get(path, headers={**ctx['auth'], **({'If-None-Match': etag} if etag else {})})
+    if 'etag' in response.headers:
+        ctx['etags'][path] = response.headers['etag']
+    return response
+
+
+async def like_unlike(client, rng, ctx):
+    post_id = rng.randrange(1, ctx['posts'] + 1)
+    await client.post(f'/posts/{post_id}/like', headers=ctx['auth'])
+    return await client.delete(f'/posts/{post_id}/like', headers=ctx['auth'])
+
+
+def upload(client, rng, ctx):
+    files = [('image_files', (f'{i}.jpg', JPEG + rng.randbytes(1024), 'image/jpeg')) for i in range(rng.randint(1, 5))]
+    return client.post(f'/pets/{ctx["own_pet"]}/posts', data={'text': 'bench'}, files=files, headers=ctx['auth'])
+
+
+WORKLOADS = {
+    'feed': feed,
+    'feed_deep': feed_deep,
+    'home_feed': home_feed,
+    'search': search,
+    'pet_posts': pet_posts,
+    'post': post,
+    'batch': batch,
+    'poll': poll,
+    'like_unlike': like_unlike,
+    'upload': upload,
+}
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+
+async def run_workload(name, url, clients, duration, seed, ctx):
+    latencies = []
+    errors = 0
+
+    async def client_loop(index):
+        nonlocal errors
+        rng = random.Random(f'{seed}-{name}-{index}')
+        async with httpx.AsyncClient(base_url=url, timeout=30) as client:
+            deadline = time.perf_counter() + duration
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    response = await WORKLOADS[name](client, rng, ctx)
+                    if response.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[client_loop(i) for i in range(clients)])
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput': len(latencies) / elapsed,
+        'p50_ms': statistics.median(latencies) if latencies else None,
+        'p95_ms': percentile(latencies, 95) if latencies else None,
+        'p99_ms': percentile(latencies, 99) if latencies else None,
+    }
+
+
+async def login(url, username, password):
+    async with httpx.AsyncClient(base_url=url) as client:
+        tokens = (await client.post('/auth/login', json={'username': username, 'password': password})).raise_for_status().json()
+        auth = {'Authorization': f'Bearer {tokens["access"]}'}
+        me = (await client.get('/users/me', headers=auth)).raise_for_status().json()
+    return auth, me['pets'][0]['id'] if me.get('pets') else None
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(__file__), text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main(args):
+    auth, own_pet = await login(args.url, args.username, args.password)
+    ctx = {'auth': auth, 'own_pet': own_pet, 'pets': args.pets, 'posts': args.posts, 'etags': {}}
+    results = {}
+    for name in args.workloads:
+        if name == 'upload' and own_pet is None:
+            continue
+        results[name] = await run_workload(name, args.url, args.clients, args.duration, args.seed, ctx)
+        print(f'{name}: {results[name]}', file=sys.stderr)
+    return {
+        'commit': git_commit(),
+        'clients': args.clients,
+        'duration': args.duration,
+        'seed': args.seed,
+        'workloads': results,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://localhost:8080')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--workloads', nargs='+', default=list(WORKLOADS), choices=list(WORKLOADS))
+    parser.add_argument('--username', default='user1')
+    parser.add_argument('--password', default='password')
+    parser.add_argument('--pets', type=int, default=100000, help='as passed to seed.py')
+    parser.add_argument('--posts', type=int, default=1000000, help='as passed to seed.py')
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main(args)), indent=2, sort_keys=True))
@@ -0,0 +1,61 @@
+"""p50/p99 latency of search.get_posts for typical filter mixes.
+
+Run against a database filled by bench/seed.py:
+
+    POSTGRES_DATABASE_URL=... python bench/search.py --runs 200
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from database import SessionLocal
+import schemas, search
+
+FILTERS = {
+    'none': {},
+    'species': {'species': 'dog'},
+    'species_sex': {'species': 'cat', 'sex': 'female'},
+    'species_sex_age': {'species': 'dog', 'sex': 'male', 'gte_date': date(2018, 1, 1)},
+    'homeless': {'has_home': False, 'species': 'dog'},
+    'location': {'country': 'Ukraine', 'city': 'Kyiv'},
+    'near': {'near': (50.45, 30.52), 'radius_km': 30},
+    'near_wide': {'near': (52.23, 21.01), 'radius_km': 300, 'species': 'dog'},
+    'text': {'q': 'calm husky'},
+    'text_rare': {'q': 'lazy smart snow sphynx'},
+    'text_species': {'q': 'playful', 'species': 'dog', 'has_home': False},
+    'everything': {'species': 'dog', 'sex': 'female', 'gte_date': date(2015, 1, 1), 'country': 'Ukraine', 'city': 'Lviv', 'has_home': False},
+}
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+
+def run(runs: int, limit: int, user_id: int):
+    db = SessionLocal()
+    try:
+        for name, params in FILTERS.items():
+            query = schemas.Search(**params)
+            timings = []
+            for i in range(runs):
+                started = time.perf_counter()
+                search.get_posts(db=db, offset=0, limit=limit, query=query, user_id=user_id)
+                timings.append((time.perf_counter() - started) * 1000)
+            print(f'{name:16} p50={statistics.median(timings):8.2f}ms p99={percentile(timings, 99):8.2f}ms')
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=100)
+    parser.add_argument('--limit', type=int, default=100)
+    parser.add_argument('--user-id', type=int, default=1)
+    args = parser.parse_args()
+    run(args.runs, args.limit, args.user_id)
@@ -0,0 +1,129 @@
+"""Deterministic synthetic dataset for benchmarks.
+
+The same arguments always produce the same rows, so results of different
+commits are comparable. Posts, likes and comments are skewed: a few pets
+get most posts and a few posts most likes and comments. Every user's
+password is 'password'.
+
+    POSTGRES_DATABASE_URL=... python bench/seed.py --posts 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import text
+from database import engine, SessionLocal
+import fanout
+
+SPECIES = ['dog', 'cat', 'parrot', 'rabbit', 'hamster']
+# (country, city, latitude, longitude); seeded places are districts scattered around them
+CITIES = [
+    ('Ukraine', 'Kyiv', 50.45, 30.52), ('Ukraine', 'Lviv', 49.84, 24.03), ('Ukraine', 'Odesa', 46.48, 30.73),
+    ('Ukraine', 'Kharkiv', 49.99, 36.23), ('Poland', 'Warsaw', 52.23, 21.01), ('Poland', 'Krakow', 50.06, 19.94),
+    ('Poland', 'Gdansk', 54.35, 18.65), ('Germany', 'Berlin', 52.52, 13.40), ('Germany', 'Munich', 48.14, 11.58),
+    ('Germany', 'Hamburg', 53.55, 9.99),
+]
+# vocabulary of descriptions and post texts, for full text search
+WORDS = ['calm', 'playful', 'friendly', 'shy', 'energetic', 'gentle', 'curious', 'loyal', 'lazy', 'smart',
+         'walk', 'park', 'sleep', 'cuddle', 'ball', 'snow', 'beach', 'treat', 'bath', 'garden']
+BREEDS = ['husky', 'labrador', 'beagle', 'poodle', 'shepherd', 'siamese', 'persian', 'sphynx', 'bengal', 'macaw']
+EPOCH = '2026-01-01 00:00:00'
+SEED = 0.42
+
+
+def sql_array(values):
+    return 'ARRAY[' + ','.join(f"'{v}'" for v in values) + ']'
+
+
+def seed(locations: int, users: int, pets: int, posts: int, likes: int, comments: int):
+    command.upgrade(Config(os.path.join(os.path.dirname(__file__), '..', 'alembic.ini')), 'head')
+    countries = sql_array(country for country, _, _, _ in CITIES)
+    cities = sql_array(city for _, city, _, _ in CITIES)
+    latitudes = 'ARRAY[' + ','.join(str(lat) for _, _, lat, _ in CITIES) + ']'
+    longitudes = 'ARRAY[' + ','.join(str(lon) for _, _, _, lon in CITIES) + ']'
+    species = sql_array(SPECIES)
+    words = sql_array(WORDS)
+    breeds = sql_array(BREEDS)
+
+    def phrase(n):
+        return " || ' ' || ".join([f"({words})[1 + (random() * {len(WORDS) - 1})::int]"] * n + [f"({breeds})[1 + (random() * {len(BREEDS) - 1})::int]"])
+
+    with engine.begin() as conn:
+        conn.execute(text("SET LOCAL synchronous_commit = off"))
+        conn.execute(text("TRUNCATE feed_items, blobs, likes, comments, posts, transfers, shelters, pets, users, locations RESTART IDENTITY CASCADE"))
+        conn.execute(text("SELECT setseed(:seed)"), {'seed': SEED})
+        conn.execute(text(f"""
+            INSERT INTO locations (country, state, city, latitude, longitude)
+            SELECT ({countries})[1 + i % {len(CITIES)}], 'District ' || i, ({cities})[1 + i % {len(CITIES)}],
+                   ({latitudes})[1 + i % {len(CITIES)}] + random() - 0.5, ({longitudes})[1 + i % {len(CITIES)}] + random() - 0.5
+            FROM generate_series(1, :n) i"""), {'n': locations})
+        conn.execute(text("""
+            INSERT INTO users (email, username, hashed_password, location_id)
+            SELECT 'user' || i || '@example.com', 'user' || i, 'passwordnotreallyhashed', 1 + i % :locations
+            FROM generate_series(1, :n) i"""), {'n': users, 'locations': locations})
+        conn.execute(text(f"""
+            INSERT INTO pets (name, description, sex, species, birth_date, image, has_home, owner_id)
+            SELECT 'pet' || i, {phrase(4)}, (ARRAY['male', 'female'])[1 + i % 2],
+                   ({species})[1 + i % 5], date '2010-01-01' + (i % 4000),
+                   '/static/pet_avatars/' || md5('pet' || i) || '.jpg', i % 3 = 0, 1 + i % :users
+            FROM generate_series(1, :n) i"""), {'n': pets, 'users': users})
+        # 1 to 5 images per post, a few pets own most of the posts
+        conn.execute(text(f"""
+            INSERT INTO posts (text, owner_id, images, time)
+            SELECT {phrase(3)}, 1 + (random() * random() * (:pets - 1))::int,
+                   (SELECT array_agg('/static/post_images/' || md5(i || '-' || j) || '.jpg')
+                    FROM generate_series(1, 1 + i % 5) j),
+                   CAST(:epoch AS timestamp) - (random() * interval '365 days')
+            FROM generate_series(1, :n) i"""), {'n': posts, 'pets': pets, 'epoch': EPOCH})
+        conn.execute(text("""
+            INSERT INTO likes (post_id, owner_id)
+            SELECT 1 + (random() * random() * random() * (:posts - 1))::int, 1 + (random() * (:users - 1))::int
+            FROM generate_series(1, :n) i
+            ON CONFLICT ON CONSTRAINT post_owner_key DO NOTHING"""), {'n': likes, 'posts': posts, 'users': users})
+        conn.execute(text("""
+            INSERT INTO comments (text, post_id, owner_id, time)
+            SELECT 'comment ' || i, 1 + (random() * random() * (:posts - 1))::int,
+                   1 + (random() * (:users - 1))::int, CAST(:epoch AS timestamp) - (random() * interval '365 days')
+            FROM generate_series(1, :n) i"""), {'n': comments, 'posts': posts, 'users': users, 'epoch': EPOCH})
+        conn.execute(text("""
+            UPDATE posts SET likes_count = l.count
+            FROM (SELECT post_id, count(*) AS count FROM likes GROUP BY post_id) l
+            WHERE l.post_id = posts.id"""))
+        conn.execute(text("""
+            UPDATE posts SET comments_count = c.count
+            FROM (SELECT post_id, count(*) AS count FROM comments GROUP BY post_id) c
+            WHERE c.post_id = posts.id"""))
+        conn.execute(text("""
+            INSERT INTO blobs (path, refcount)
+            SELECT path, count(*) FROM (
+                SELECT image AS path FROM pets
+                UNION ALL
+                SELECT unnest(images) FROM posts
+            ) refs
+            GROUP BY path"""))
+    db = SessionLocal()
+    try:
+        fanout.rebuild(db)
+    finally:
+        db.close()
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.execute(text("VACUUM ANALYZE"))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--locations', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=50000)
+    parser.add_argument('--pets', type=int, default=100000)
+    parser.add_argument('--posts', type=int, default=1000000)
+    parser.add_argument('--likes', type=int, default=3000000)
+    parser.add_argument('--comments', type=int, default=1000000)
+    args = parser.parse_args()
+    started = time.perf_counter()
+    seed(args.locations, args.users, args.pets, args.posts, args.likes, args.comments)
+    print(f'seeded in {time.perf_counter() - started:.1f}s')
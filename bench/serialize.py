@@ -0,0 +1,72 @@
+"""Serialization time of one feed page, the old way and through responses.respond.
+
+No database needed:
+
+    python bench/serialize.py --posts 100 --runs 200
+
+"before" is what the handlers did until responses.py: prefix the image
+paths in place, validate against response_model, jsonable_encoder and the
+stdlib json encoder.
+"""
+import argparse
+import copy
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from fastapi.encoders import jsonable_encoder
+import responses, schemas
+
+
+def feed_page(posts: int):
+    started = datetime(2026, 1, 1)
+    page = []
+    for i in range(posts):
+        images = [f'/static/post_images/ab/cd/{i:060d}{n:04d}.jpg' for n in range(3)]
+        page.append({
+            'id': i, 'text': f'post {i}', 'images': images,
+            'image_variants': [{size: {'webp': path[:-4] + f'_{size}.webp', 'jpeg': path[:-4] + f'_{size}.jpg'} for size in ('thumb', 'medium')} for path in images],
+            'time': started - timedelta(minutes=i), 'owner_id': i % 50, 'avatar': f'/static/pet_avatars/{i}.jpg', 'name': f'pet {i % 50}',
+            'country': 'Ukraine', 'state': None, 'city': 'Kyiv', 'likes_count': 10, 'comments_count': 5, 'liked': False,
+            'comments': [{'id': i * 5 + c, 'text': 'nice', 'time': started, 'owner_id': c, 'post_id': i, 'username': f'user{c}'} for c in range(5)],
+        })
+    return page
+
+
+def before(page):
+    for post in page:
+        post['images'] = [responses.IMAGES_PUBLIC_URL + path for path in post['images']]
+        post['image_variants'] = responses.public_variants(post['image_variants'])
+        post['avatar'] = responses.IMAGES_PUBLIC_URL + post['avatar']
+    validated = [schemas.Post.parse_obj(post) for post in page]
+    return json.dumps(jsonable_encoder(validated)).encode()
+
+
+def after(page):
+    return responses.respond(page, schemas.Post).body
+
+
+def measure(fn, page, runs):
+    timings = []
+    for _ in range(runs):
+        data = copy.deepcopy(page)
+        started = time.perf_counter()
+        fn(data)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {'p50_ms': statistics.median(timings), 'p99_ms': timings[int(len(timings) * .99)]}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--posts', type=int, default=100)
+    parser.add_argument('--runs', type=int, default=200)
+    args = parser.parse_args()
+    page = feed_page(args.posts)
+    assert json.loads(before(copy.deepcopy(page))) == json.loads(after(copy.deepcopy(page)))
+    print(json.dumps({'posts': args.posts, 'before': measure(before, page, args.runs), 'after': measure(after, page, args.runs)}, indent=2))
@@ -0,0 +1,71 @@
+"""Requests/sec and CPU per image: plain StaticFiles against ImmutableStaticFiles.
+
+Drives both ASGI apps in-process over the same files, with and without a
+revalidating client (If-None-Match):
+
+    python bench/static.py --requests 5000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from starlette.staticfiles import StaticFiles
+import static
+
+
+async def request(app, path: str, headers: list):
+    scope = {'type': 'http', 'method': 'GET', 'path': path, 'root_path': '', 'query_string': b'', 'headers': headers, 'http_version': '1.1', 'scheme': 'http', 'server': ('bench', 80)}
+    result = {}
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            result['status'] = message['status']
+            result['headers'] = dict(message['headers'])
+
+    await app(scope, receive, send)
+    return result
+
+
+async def measure(app, paths: list, requests: int, revalidate: bool):
+    headers = [[] for _ in paths]
+    if revalidate:
+        for i, path in enumerate(paths):
+            response = await request(app, path, [])
+            if b'etag' in response['headers']:
+                headers[i] = [(b'if-none-match', response['headers'][b'etag'])]
+    wall, cpu = time.perf_counter(), time.process_time()
+    for i in range(requests):
+        await request(app, paths[i % len(paths)], headers[i % len(paths)])
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    return requests / wall, cpu / requests * 1e6
+
+
+async def main(requests: int, files: int, size: int):
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for i in range(files):
+            with open(os.path.join(directory, f'{i:064x}.jpg'), 'wb') as f:
+                f.write(os.urandom(size))
+            paths.append(f'/{i:064x}.jpg')
+        apps = {'StaticFiles': StaticFiles(directory=directory), 'ImmutableStaticFiles': static.ImmutableStaticFiles(directory=directory)}
+        for name, app in apps.items():
+            for revalidate in (False, True):
+                rate, cpu = await measure(app, paths, requests, revalidate)
+                print(f'{name:22} revalidate={revalidate!s:5} {rate:9.1f} req/s {cpu:8.1f} us cpu/req')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--files', type=int, default=50)
+    parser.add_argument('--size', type=int, default=200 * 1024)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.files, args.size))
@@ -0,0 +1,35 @@
+"""Awaitable versions of the crud, search, helpers and storage functions.
+
+Each function runs the existing sync implementation through
+AsyncSession.run_sync, so queries go over asyncpg without blocking the
+event loop and the query logic lives in one place:
+
+    await aio.crud.get_pet(db=db, pet_id=pet_id)
+"""
+import functools
+from types import ModuleType
+from sqlalchemy.ext.asyncio import AsyncSession
+import crud as _crud, search as _search, helpers as _helpers, storage as _storage
+
+
+def run_sync(fn):
+    @functools.wraps(fn)
+    async def wrapper(db: AsyncSession, *args, **kwargs):
+        return await db.run_sync(fn, *args, **kwargs)
+    return wrapper
+
+
+class AsyncModule:
+    def __init__(self, module: ModuleType):
+        self._module = module
+
+    def __getattr__(self, name):
+        fn = run_sync(getattr(self._module, name))
+        setattr(self, name, fn)
+        return fn
+
+
+crud = AsyncModule(_crud)
+search = AsyncModule(_search)
+helpers = AsyncModule(_helpers)
+storage = AsyncModule(_storage)
@@ -0,0 +1,232 @@
+"""Bulk import of partner catalogs.
+
+Rows are read from CSV or NDJSON, validated with the schemas *Import models
+and streamed with COPY into a temporary staging table, one batch at a time.
+Per batch a few set-based statements then drop the staged rows that would
+violate a constraint (unknown owner, taken username, ...), reserve ids from
+the table's sequence and move the rest over with one INSERT ... SELECT, so
+nothing goes through the ORM row by row.
+
+Every rejected row is reported with its line number and the reason, every
+imported one with the id it got, which later files can refer to (pets.csv
+needs the ids of the imported users as owner_id, and so on).
+"""
+import csv
+import json
+import io
+import time
+from concurrent.futures import Future
+from datetime import date, datetime
+from pydantic import ValidationError
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+import invalidation, locations, passwords, schemas
+
+BATCH_SIZE = 50000
+
+# list valued fields are JSON arrays in CSV files
+LIST_FIELDS = {'images'}
+
+
+class Table:
+    def __init__(self, name, model, columns, row, rejects, insert, before=(), after=(), invalidates=False):
+        self.name = name
+        self.model = model
+        # staging columns besides line and id, as (name, type)
+        self.columns = columns
+        self.row = row
+        # (reason, WHERE clause over staging s) of rows that must not be inserted
+        self.rejects = rejects
+        self.insert = insert
+        # run before ids are reserved for the staged rows that have none yet
+        self.before = before
+        self.after = after
+        self.invalidates = invalidates
+
+
+STAGED_PLACE = "(coalesce(s.country, ''), coalesce(s.state, ''), coalesce(s.city, ''))"
+LOCATION_PLACE = "(coalesce(l.country, ''), coalesce(l.state, ''), coalesce(l.city, ''))"
+
+TABLES = {t.name: t for t in (
+    Table(
+        'locations', schemas.LocationImport,
+        [('country', 'text'), ('state', 'text'), ('city', 'text'), ('latitude', 'double precision'), ('longitude', 'double precision')],
+        lambda r: (locations.normalize(r.country), locations.normalize(r.state), locations.normalize(r.city), r.latitude, r.longitude),
+        [('duplicate place in file', f"s.line IN (SELECT line FROM (SELECT line, row_number() OVER (PARTITION BY {STAGED_PLACE} ORDER BY line) AS n FROM staging s) d WHERE n > 1)")],
+        # known places, e.g. created from user profiles, get their coordinates
+        """INSERT INTO locations (id, country, state, city, latitude, longitude)
+           SELECT id, country, state, city, latitude, longitude FROM staging
+           ON CONFLICT (id) DO UPDATE SET latitude = excluded.latitude, longitude = excluded.longitude""",
+        before=[f"UPDATE staging s SET id = l.id FROM locations l WHERE {LOCATION_PLACE} = {STAGED_PLACE}"],
+    ),
+    Table(
+        'users', schemas.UserImport,
+        [('username', 'text'), ('email', 'text'), ('hashed_password', 'text'), ('country', 'text'),
+         ('state', 'text'), ('city', 'text'), ('address', 'text'), ('phone', 'text')],
+        # hashed on the password pool while the rest of the batch is read
+        lambda r: (r.username, r.email, passwords.executor.submit(passwords.hash, r.password), locations.normalize(r.country), locations.normalize(r.state), locations.normalize(r.city), r.address, r.phone),
+        [
+            ('username or email already exists', "EXISTS (SELECT 1 FROM users u WHERE u.username = s.username OR u.email = s.email)"),
+            ('duplicate username in file', "s.line IN (SELECT line FROM (SELECT line, row_number() OVER (PARTITION BY username ORDER BY line) AS n FROM staging) d WHERE n > 1)"),
+            ('duplicate email in file', "s.line IN (SELECT line FROM (SELECT line, row_number() OVER (PARTITION BY email ORDER BY line) AS n FROM staging) d WHERE n > 1)"),
+        ],
+        f"""INSERT INTO users (id, username, email, hashed_password, location_id, address, phone)
+            SELECT s.id, s.username, s.email, s.hashed_password, l.id, s.address, s.phone
+            FROM staging s LEFT JOIN locations l ON {LOCATION_PLACE} = {STAGED_PLACE}""",
+        before=["""INSERT INTO locations (country, state, city)
+                    SELECT DISTINCT country, state, city FROM staging s WHERE coalesce(country, state, city) IS NOT NULL
+                    ON CONFLICT ((coalesce(country, '')), (coalesce(state, '')), (coalesce(city, ''))) DO NOTHING"""],
+    ),
+    Table(
+        'pets', schemas.PetImport,
+        [('name', 'text'), ('description', 'text'), ('sex', 'text'), ('species', 'text'), ('birth_date', 'date'),
+         ('image', 'text'), ('has_home', 'boolean'), ('owner_id', 'integer')],
+        lambda r: (r.name, r.description, r.sex, r.species, r.birth_date, r.image, r.has_home, r.owner_id),
+        [('unknown owner_id', "NOT EXISTS (SELECT 1 FROM users u WHERE u.id = s.owner_id)")],
+        """INSERT INTO pets (id, name, description, sex, species, birth_date, image, has_home, owner_id)
+           SELECT id, name, description, sex, species, birth_date, image, has_home, owner_id FROM staging""",
+        # cached users embed their pets
+        after=["UPDATE users SET version = version + 1 WHERE id IN (SELECT owner_id FROM staging)"],
+        invalidates=True,
+    ),
+    Table(
+        'posts', schemas.PostImport,
+        [('text', 'text'), ('images', 'jsonb'), ('owner_id', 'integer'), ('time', 'timestamp')],
+        lambda r: (r.text, r.images, r.owner_id, r.time),
+        [('unknown owner_id', "NOT EXISTS (SELECT 1 FROM pets p WHERE p.id = s.owner_id)")],
+        """INSERT INTO posts (id, text, images, owner_id, time)
+           SELECT id, text, CASE WHEN images IS NOT NULL THEN ARRAY(SELECT jsonb_array_elements_text(images)) END, owner_id, coalesce(time, now() AT TIME ZONE 'utc')
+           FROM staging""",
+    ),
+    Table(
+        'comments', schemas.CommentImport,
+        [('text', 'text'), ('post_id', 'integer'), ('owner_id', 'integer'), ('time', 'timestamp')],
+        lambda r: (r.text, r.post_id, r.owner_id, r.time),
+        [
+            ('unknown post_id', "NOT EXISTS (SELECT 1 FROM posts p WHERE p.id = s.post_id)"),
+            ('unknown owner_id', "NOT EXISTS (SELECT 1 FROM users u WHERE u.id = s.owner_id)"),
+        ],
+        """INSERT INTO comments (id, text, post_id, owner_id, time)
+           SELECT id, text, post_id, owner_id, coalesce(time, now() AT TIME ZONE 'utc') FROM staging""",
+        after=["""UPDATE posts SET comments_count = comments_count + c.n, version = version + 1
+                  FROM (SELECT post_id, count(*) AS n FROM staging GROUP BY post_id) c
+                  WHERE posts.id = c.post_id"""],
+        # cached posts carry comments_count
+        invalidates=True,
+    ),
+)}
+
+
+def copy_value(value) -> str:
+    """value in COPY text format."""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, (list, dict)):
+        value = json.dumps(value)
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def read_rows(file, format: str):
+    """(line number, dict) of every row in file."""
+    if format == 'ndjson':
+        for line, raw in enumerate(file, 1):
+            if raw.strip():
+                try:
+                    yield line, json.loads(raw)
+                except ValueError as e:
+                    yield line, e
+        return
+    reader = csv.DictReader(file)
+    for values in reader:
+        row = {}
+        try:
+            for key, value in values.items():
+                if value == '':
+                    continue
+                row[key] = json.loads(value) if key in LIST_FIELDS else value
+        except ValueError as e:
+            row = e
+        yield reader.line_num, row
+
+
+class Report:
+    def __init__(self, rejects=None, ids=None):
+        self.rejects = rejects
+        self.ids = ids
+        self.imported = 0
+        self.rejected = 0
+        self.started = time.perf_counter()
+
+    def reject(self, line: int, reason, row=None):
+        self.rejected += 1
+        if self.rejects is not None:
+            self.rejects.write(json.dumps({'line': line, 'reason': reason, 'row': row}, default=str) + '\n')
+
+    def imported_ids(self, pairs):
+        for line, id in pairs:
+            self.imported += 1
+            if self.ids is not None:
+                self.ids.write(json.dumps({'line': line, 'id': id}) + '\n')
+
+    @property
+    def rows_per_second(self):
+        return (self.imported + self.rejected) / max(time.perf_counter() - self.started, 1e-9)
+
+
+def load_batch(db: Session, table: Table, batch: list, report: Report):
+    columns = ', '.join(f'{name} {type}' for name, type in table.columns)
+    db.execute(text(f"CREATE TEMPORARY TABLE staging (line integer PRIMARY KEY, id integer, {columns}) ON COMMIT DROP"))
+    buffer = io.StringIO()
+    for line, values in batch:
+        values = [v.result() if isinstance(v, Future) else v for v in values]
+        buffer.write('\t'.join(copy_value(v) for v in [line] + values) + '\n')
+    buffer.seek(0)
+    columns = ', '.join(['line'] + [name for name, _ in table.columns])
+    cursor = db.connection().connection.cursor()
+    cursor.copy_expert(f"COPY staging ({columns}) FROM STDIN", buffer)
+
+    for reason, condition in table.rejects:
+        for line, in db.execute(text(f"DELETE FROM staging s WHERE {condition} RETURNING s.line")):
+            report.reject(line, reason)
+
+    for statement in table.before:
+        db.execute(text(statement))
+    db.execute(text(f"UPDATE staging SET id = nextval(pg_get_serial_sequence('{table.name}', 'id')) WHERE id IS NULL"))
+    db.execute(text(table.insert))
+    for statement in table.after:
+        db.execute(text(statement))
+    if table.invalidates:
+        invalidation.invalidate_all(db)
+    imported = db.execute(text("SELECT line, id FROM staging ORDER BY line")).all()
+    db.commit()
+    report.imported_ids(imported)
+
+
+def import_file(db: Session, table_name: str, file, format: str = 'csv', report: Report | None = None, batch_size: int = BATCH_SIZE) -> Report:
+    """Imports every valid row of file into table_name, committing batch by batch."""
+    table = TABLES[table_name]
+    report = report or Report()
+    batch = []
+    try:
+        for line, row in read_rows(file, format):
+            if isinstance(row, Exception):
+                report.reject(line, str(row))
+                continue
+            try:
+                batch.append((line, table.row(table.model.parse_obj(row))))
+            except ValidationError as e:
+                report.reject(line, e.errors(), row)
+                continue
+            if len(batch) >= batch_size:
+                load_batch(db, table, batch, report)
+                batch = []
+        if batch:
+            load_batch(db, table, batch, report)
+    except BaseException:
+        db.rollback()
+        raise
+    return report
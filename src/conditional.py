@@ -0,0 +1,62 @@
+"""ETags and 304 Not Modified for entities and feeds.
+
+A tag hashes the versions a response is built from: the entity's own
+version, the versions of the rows it embeds (a post shows its pet and the
+owner's place) and the viewer's liked flags. Handlers of a request with
+If-None-Match first fetch just those versions; when the client's tag is
+still current they answer 304 without assembling the body:
+
+    if conditional.requested(request):
+        versions = crud.get_post_versions(db, post_id, user_id)
+        if versions is not None and conditional.current(request, response, conditional.post_tag(versions)):
+            return conditional.not_modified(response)
+
+No Last-Modified is sent: post times stay put when likes, comments or image
+variants change, and pets and users have no time at all, so a date would
+validate stale bodies.
+"""
+import hashlib
+from fastapi import Request, Response
+
+# headers a 304 repeats from the response it stands for
+KEPT = ('etag', 'vary', 'x-next-cursor')
+
+
+def etag(*parts) -> str:
+    return '"' + hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest() + '"'
+
+
+def pet_tag(pet) -> str:
+    return etag('pet', pet['id'], pet['version'], pet['user_version'])
+
+
+def user_tag(user) -> str:
+    return etag('user', user['id'], user['version'])
+
+
+def post_tag(post) -> str:
+    return etag('post', post['id'], post['version'], post['pet_version'], post['user_version'], bool(post['liked']))
+
+
+def page_tag(posts) -> str:
+    return etag('posts', *[(post['id'], post['version'], post['pet_version'], bool(post['liked'])) for post in posts])
+
+
+def requested(request: Request) -> bool:
+    return 'if-none-match' in request.headers
+
+
+def current(request: Request, response: Response, tag: str) -> bool:
+    """Sets tag as the ETag of response, True when If-None-Match names it."""
+    response.headers['ETag'] = tag
+    header = request.headers.get('if-none-match')
+    if header is None:
+        return False
+    if header.strip() == '*':
+        return True
+    # weak comparison, as RFC 9110 asks for If-None-Match
+    return tag in [candidate.strip().removeprefix('W/') for candidate in header.split(',')]
+
+
+def not_modified(response: Response) -> Response:
+    return Response(status_code=304, headers={key: value for key, value in response.headers.items() if key in KEPT})
@@ -1,24 +1,10 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from sqlalchemy.inspection import inspect
+from sqlalchemy import delete, desc, func, select, or_
 from sqlalchemy import exc
-import models, schemas
+import models, schemas, feed, pagination, cache, invalidation, storage, locations, fanout
 
-from sqlalchemy.inspection import inspect
-
-def to_dict(obj, with_relationships=True):
-    d = {}
-    for column in obj.__table__.columns:
-        if with_relationships and len(column.foreign_keys) > 0:
-             # Skip foreign keys
-            continue
-        d[column.name] = getattr(obj, column.name)
-
-    if with_relationships:
-        for relationship in inspect(type(obj)).relationships:
-            val = getattr(obj, relationship.key)
-            d[relationship.key] = to_dict(val) if val else None
-    return d
+# Read paths select table columns and turn the rows into dicts with
+# Row._asdict(): nothing is hydrated into ORM objects or the identity map.
 
 
 def get_user(db: Session, user_id: int):
@@ -34,9 +20,8 @@ def get_users(db: Session, skip: int = 0, limit: int = 100):
     return filtered_users
 
 
-def create_user(db: Session, user: schemas.UserCreate):
-    fake_hashed_password = user.password + "notreallyhashed"
-    db_user = models.User(email=user.email, username=user.username, hashed_password=fake_hashed_password)
+def create_user(db: Session, user: schemas.UserCreate, hashed_password: str):
+    db_user = models.User(email=user.email, username=user.username, hashed_password=hashed_password)
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
@@ -44,39 +29,70 @@ def create_user(db: Session, user: schemas.UserCreate):
 
 def update_user(db: Session, user: schemas.UserUpdate, user_id: int):
     db_user = db.query(models.User).filter(models.User.id == user_id).first()
-    for key, value in user.dict(exclude_unset=True).items():
+    changes = user.dict(exclude_unset=True)
+    place = {part: changes.pop(part) for part in ('country', 'state', 'city') if part in changes}
+    for key, value in changes.items():
         setattr(db_user, key, value)
+    location = db.get(models.Location, db_user.location_id) if db_user.location_id else None
+    current = {part: getattr(location, part, None) for part in ('country', 'state', 'city')}
+    if place:
+        current.update(place)
+        db_user.location_id = locations.resolve(db, **current)
+    invalidation.invalidate(db, ('user', user_id))
     db.commit()
     db.refresh(db_user)
-    return db_user.to_dict()
+    return {**db_user.to_dict(), **{part: locations.normalize(value) for part, value in current.items()}}
+
 
+def pet_query(db: Session):
+    """Pets with their owner's place, as get_pet caches them."""
+    return db.query(*models.columns(models.Pet), *locations.columns(), models.User.version.label('user_version')).join(models.User, models.User.id == models.Pet.owner_id).outerjoin(models.Location, models.Location.id == models.User.location_id)
 
 def get_pet(db: Session, pet_id: int):
-    pet = db.query(models.Pet,models.User.country.label('country'),models.User.state.label('state'),models.User.city.label('city')).join(models.User).filter(models.Pet.id == pet_id, models.User.id == models.Pet.owner_id).first()
+    key = ('pet', pet_id)
+    pet_dict = cache.entities.get(key)
+    if pet_dict is not None:
+        return pet_dict
+    pet = pet_query(db).filter(models.Pet.id == pet_id).first()
     if pet:
-        pet_dict = pet[0].to_dict()
-        pet_dict['country'] = pet[1]
-        pet_dict['state'] = pet[2]
-        pet_dict['city'] = pet[3]
+        pet_dict = pet._asdict()
+        cache.entities.set(key, pet_dict, tags=[('user', pet_dict['owner_id'])])
         return pet_dict
     else:
         return []
 
-def get_pets(db: Session, offset: int = 0, limit: int = 100):
-    pets = db.query(models.Pet,models.User.country.label('country'),models.User.state.label('state'),models.User.city.label('city')).join(models.User).filter(models.User.id == models.Pet.owner_id).offset(offset).limit(limit).all()
-    pets_filtered = []
-    for pet in pets:
-        pet_dict = pet[0].to_dict()
-        pet_dict['country'] = pet[1]
-        pet_dict['state'] = pet[2]
-        pet_dict['city'] = pet[3]
-        pets_filtered.append(pet_dict)
-        
-    return pets_filtered
+def get_pets_by_ids(db: Session, ids: list):
+    """Pets with these ids in this order, missing ones left out; what is not cached comes with one IN query."""
+    found = {}
+    for pet_id in ids:
+        pet_dict = cache.entities.get(('pet', pet_id))
+        if pet_dict is not None:
+            found[pet_id] = pet_dict
+    missing = [pet_id for pet_id in ids if pet_id not in found]
+    if missing:
+        for pet in pet_query(db).filter(models.Pet.id.in_(missing)):
+            pet_dict = pet._asdict()
+            cache.entities.set(('pet', pet_dict['id']), pet_dict, tags=[('user', pet_dict['owner_id'])])
+            found[pet_dict['id']] = pet_dict
+    return [found[pet_id] for pet_id in ids if pet_id in found]
+
+def get_pet_versions(db: Session, pet_id: int):
+    """What conditional.pet_tag needs of the pet, from the cache or one small query; None if there is no pet."""
+    pet = cache.entities.get(('pet', pet_id))
+    if pet is not None:
+        return pet
+    pet = db.query(models.Pet.id, models.Pet.version, models.User.version.label('user_version')).join(models.User, models.User.id == models.Pet.owner_id).filter(models.Pet.id == pet_id).first()
+    return pet._asdict() if pet else None
+
+def get_pets(db: Session, offset: int = 0, limit: int = 100, cursor: str = None):
+    query = db.query(*models.columns(models.Pet), *locations.columns()).join(models.User, models.User.id == models.Pet.owner_id).outerjoin(models.Location, models.Location.id == models.User.location_id)
+    pets = pagination.keyset(query, (models.Pet.id,), cursor, descending=False).offset(offset).limit(limit).all()
+    return [pet._asdict() for pet in pets]
 
 def create_pet(db: Session, pet: schemas.PetCreate, user_id: int):
     db_pet = models.Pet(**pet.dict(), owner_id=user_id)
     db.add(db_pet)
+    invalidation.invalidate(db, ('user', user_id))
     db.commit()
     db.refresh(db_pet)
     return db_pet.to_dict()
@@ -85,75 +101,132 @@ def update_pet(db: Session, pet: schemas.PetUpdate, pet_id: int):
     db_pet = db.query(models.Pet).filter(models.Pet.id == pet_id).first()
     for key, value in pet.dict(exclude_unset=True).items():
         setattr(db_pet, key, value)
+    invalidation.invalidate(db, ('pet', pet_id), ('user', db_pet.owner_id))
     db.commit()
     db.refresh(db_pet) #refresh the attribute of the given instan
     return db_pet.to_dict()
 
+def set_pet_image_variants(db: Session, pet_id: int, variants: dict):
+    owner_id = db.query(models.Pet.owner_id).filter(models.Pet.id == pet_id).scalar()
+    db.query(models.Pet).filter(models.Pet.id == pet_id).update({models.Pet.image_variants: variants}, synchronize_session=False)
+    invalidation.invalidate(db, ('pet', pet_id), ('user', owner_id))
+    db.commit()
+
 def delete_pet(db: Session, pet_id: int):
     pet = db.query(models.Pet).filter(models.Pet.id == pet_id).first()
-    db.delete(pet)
+    posts = db.query(models.Post.id, models.Post.images).filter(models.Post.owner_id == pet_id).all()
+    storage.release(db, [pet.image] + [image for post in posts for image in post.images or []])
+    delete_posts(db, [post.id for post in posts])
+    db.query(models.Pet).filter(models.Pet.id == pet_id).delete(synchronize_session=False)
+    invalidation.invalidate(db, ('pet', pet_id), ('user', pet.owner_id))
     db.commit()
     return {"delete": "ok"}
 
+def post_query(db: Session, *columns):
+    """Posts with their pet and the owner's place, as get_post caches them, plus columns."""
+    return db.query(*models.columns(models.Post), models.Pet.name.label('name'), models.Pet.image.label('avatar'), models.Pet.owner_id.label('user'), *locations.columns(), models.Pet.version.label('pet_version'), models.User.version.label('user_version'), *columns).join(models.Pet, models.Pet.id == models.Post.owner_id).join(models.User, models.User.id == models.Pet.owner_id).outerjoin(models.Location, models.Location.id == models.User.location_id)
+
 def get_post(db: Session, post_id: int, user_id: int = None):
-    post = db.query(models.Post, models.Pet.name.label('name'), models.Pet.image.label('avatar'), models.Pet.owner_id.label('user')).join(models.Pet).filter(models.Post.id == post_id, models.Pet.id == models.Post.owner_id).first()
+    key = ('post', post_id)
+    post_dict = cache.entities.get(key)
+    if post_dict is not None:
+        post_dict['liked'] = feed.is_liked(db, post_id, user_id)
+        return post_dict
+    post = post_query(db, *feed.post_stats(user_id)).filter(models.Post.id == post_id).first()
     if post:
-        post_dict = post[0].to_dict()
-        post_dict['name'] = post[1]
-        post_dict['avatar'] = post[2]
-        post_owner = db.query(models.User).filter(models.User.id == post[3]).first()
-        post_dict['country'] = post_owner.country
-        post_dict['state'] = post_owner.state
-        post_dict['city'] = post_owner.city
-        post_dict['comments_count'] = len(post[0].comments)
-        post_dict['likes_count'] = db.query(models.Like).filter(models.Like.post_id == post[0].id).count()
-        post_dict['liked'] = bool(db.query(models.Like).filter(models.Like.post_id == post[0].id, models.Like.owner_id == user_id).count())
-
-        if post[0].comments:
-            post_dict['comments'] = []
-            for comment in post[0].comments:
-                owner = db.query(models.User).filter(models.User.id == comment.owner_id).first()
-                comment_json = comment.to_dict()
-                comment_json['username'] = owner.username
-                post_dict['comments'].append(comment_json)
+        post_dict = post._asdict()
+        user = post_dict.pop('user')
+        liked = bool(post_dict.pop('liked'))
+        feed.attach_comments(db, [post_dict])
+        # the cached copy is shared by all viewers, liked is per viewer
+        cache.entities.set(key, post_dict, tags=[('pet', post_dict['owner_id']), ('user', user)])
+        post_dict['liked'] = liked
         return post_dict
     else:
         return []
 
-def get_posts(db: Session, offset: int = 0, limit: int = 100, pet_id: int = None, user_id: int = None, liked: bool = False):
-    
-    # TODO: refactor
-    if liked:
-        query = db.query(models.Post, models.Pet.name.label('name'), models.Pet.image.label('avatar')).join(models.Pet).join(models.Like).filter(models.Like.owner_id==user_id, models.Like.post_id==models.Post.id)
-    else:
-        query = db.query(models.Post, models.Pet.name.label('name'), models.Pet.image.label('avatar')).join(models.Pet)
+def get_posts_by_ids(db: Session, ids: list, user_id: int = None):
+    """Posts with these ids in this order, missing ones left out.
+
+    What is not cached comes with one IN query for posts and one for their
+    comments; liked flags of all of them with one more.
+    """
+    found = {}
+    for post_id in ids:
+        post_dict = cache.entities.get(('post', post_id))
+        if post_dict is not None:
+            found[post_id] = post_dict
+    missing = [post_id for post_id in ids if post_id not in found]
+    if missing:
+        fetched = []
+        for post in post_query(db).filter(models.Post.id.in_(missing)):
+            post_dict = post._asdict()
+            fetched.append((post_dict, post_dict.pop('user')))
+        feed.attach_comments(db, [post_dict for post_dict, _ in fetched])
+        for post_dict, user in fetched:
+            cache.entities.set(('post', post_dict['id']), post_dict, tags=[('pet', post_dict['owner_id']), ('user', user)])
+            found[post_dict['id']] = post_dict
+    liked = feed.liked_ids(db, list(found), user_id)
+    for post_dict in found.values():
+        post_dict['liked'] = post_dict['id'] in liked
+    return [found[post_id] for post_id in ids if post_id in found]
+
+def get_post_versions(db: Session, post_id: int, user_id: int = None):
+    """What conditional.post_tag needs of the post, in one small query; None if there is no post."""
+    post = db.query(models.Post.id, models.Post.version, models.Pet.version.label('pet_version'), models.User.version.label('user_version'), *feed.post_stats(user_id)).join(models.Pet, models.Pet.id == models.Post.owner_id).join(models.User, models.User.id == models.Pet.owner_id).filter(models.Post.id == post_id).first()
+    return post._asdict() if post else None
+
+def posts_page(db: Session, columns, offset: int = 0, limit: int = 100, pet_id: int = None, user_id: int = None, liked: bool = False, cursor: str = None):
+    """Rows of columns for one page of posts, newest first."""
+    query = db.query(*columns, *feed.post_stats(user_id)).join(models.Pet, models.Pet.id == models.Post.owner_id)
 
     if pet_id is not None:
         query = query.filter(models.Post.owner_id==pet_id)
-    
+
     if liked:
-        query = query.where(models.Like.owner_id==user_id)
+        query = query.join(models.Like, models.Like.post_id == models.Post.id).filter(models.Like.owner_id==user_id)
 
-    posts = query.order_by(desc(models.Post.time)).offset(offset).limit(limit).all()
+    posts = pagination.keyset(query, (models.Post.time, models.Post.id), cursor).offset(offset).limit(limit).all()
+
+    filtered_posts = []
+    for post in posts:
+        post_dict = post._asdict()
+        post_dict['liked'] = True if liked else bool(post_dict['liked'])
+        filtered_posts.append(post_dict)
+    return filtered_posts
 
+def get_posts(db: Session, offset: int = 0, limit: int = 100, pet_id: int = None, user_id: int = None, liked: bool = False, cursor: str = None):
+    columns = (*models.columns(models.Post), models.Pet.name.label('name'), models.Pet.image.label('avatar'), models.Pet.version.label('pet_version'))
+    posts = posts_page(db, columns, offset=offset, limit=limit, pet_id=pet_id, user_id=user_id, liked=liked, cursor=cursor)
+    # comments of the whole page come back in a single query
+    return feed.attach_comments(db, posts)
+
+def get_posts_versions(db: Session, offset: int = 0, limit: int = 100, pet_id: int = None, user_id: int = None, liked: bool = False, cursor: str = None):
+    """What conditional.page_tag and the next cursor need of the page get_posts would return."""
+    columns = (models.Post.id, models.Post.time, models.Post.version, models.Pet.version.label('pet_version'))
+    return posts_page(db, columns, offset=offset, limit=limit, pet_id=pet_id, user_id=user_id, liked=liked, cursor=cursor)
+
+def feed_page(db: Session, columns, user_id: int, offset: int = 0, limit: int = 100, cursor: str = None):
+    """Rows of columns for one page of the user's home feed."""
+    entries = fanout.entries(user_id, cursor, offset + limit)
+    posts = db.query(*columns, *feed.post_stats(user_id)).join(entries, entries.c.post_id == models.Post.id).join(models.Pet, models.Pet.id == models.Post.owner_id).order_by(entries.c.time.desc(), entries.c.post_id.desc()).offset(offset).limit(limit).all()
     filtered_posts = []
     for post in posts:
-        post_dict = post[0].to_dict()
-        post_dict['name'] = post[1]
-        post_dict['avatar'] = post[2]
-        post_dict['comments_count'] = len(post[0].comments)
-        post_dict['likes_count'] = db.query(models.Like).filter(models.Like.post_id == post[0].id).count()
-        if liked:
-            post_dict['liked'] = True
-        else:
-            post_dict['liked'] = bool(db.query(models.Like).filter(models.Like.post_id == post[0].id, models.Like.owner_id == user_id).count())
-        if post[0].comments:
-            post_dict['comments'] = []
-            for comment in post[0].comments:
-                post_dict['comments'].append(comment.to_dict())
+        post_dict = post._asdict()
+        post_dict['liked'] = bool(post_dict['liked'])
         filtered_posts.append(post_dict)
     return filtered_posts
 
+def get_feed(db: Session, user_id: int, offset: int = 0, limit: int = 100, cursor: str = None):
+    """Home feed of the user from feed_items, with the posts of feed_on_read pets merged in."""
+    columns = (*models.columns(models.Post), models.Pet.name.label('name'), models.Pet.image.label('avatar'), models.Pet.version.label('pet_version'))
+    return feed.attach_comments(db, feed_page(db, columns, user_id, offset=offset, limit=limit, cursor=cursor))
+
+def get_feed_versions(db: Session, user_id: int, offset: int = 0, limit: int = 100, cursor: str = None):
+    """What conditional.page_tag and the next cursor need of the page get_feed would return."""
+    columns = (models.Post.id, models.Post.time, models.Post.version, models.Pet.version.label('pet_version'))
+    return feed_page(db, columns, user_id, offset=offset, limit=limit, cursor=cursor)
+
 def create_post(db: Session, post: schemas.PostCreate, owner_id: int):
     db_post = models.Post(**post.dict(), owner_id=owner_id)
     db.add(db_post)
@@ -163,9 +236,6 @@ def create_post(db: Session, post: schemas.PostCreate, owner_id: int):
     pet = db.query(models.Pet).filter(models.Pet.id == owner_id).first()
     created_post['name'] = pet.name
     created_post['avatar'] = pet.image
-    created_post['comments_count'] = 0
-    created_post['likes_count'] = 0 
-    
     return created_post
 
 def update_post(db: Session, post: schemas.PostCreate, post_id: int):
@@ -178,34 +248,62 @@ def update_post(db: Session, post: schemas.PostCreate, post_id: int):
     return post
 
 
+def set_post_image_variants(db: Session, post_id: int, variants: list):
+    db.query(models.Post).filter(models.Post.id == post_id).update({models.Post.image_variants: variants, models.Post.time: models.Post.time}, synchronize_session=False)
+    invalidation.invalidate(db, ('post', post_id))
+    db.commit()
+
+def delete_posts(db: Session, post_ids: list):
+    """Deletes posts with their likes, comments and feed items in four statements, whatever their number."""
+    if not post_ids:
+        return
+    db.query(models.FeedItem).filter(models.FeedItem.post_id.in_(post_ids)).delete(synchronize_session=False)
+    db.query(models.Like).filter(models.Like.post_id.in_(post_ids)).delete(synchronize_session=False)
+    db.query(models.Comment).filter(models.Comment.post_id.in_(post_ids)).delete(synchronize_session=False)
+    db.query(models.Post).filter(models.Post.id.in_(post_ids)).delete(synchronize_session=False)
+
 def delete_post(db: Session, post_id: int):
-    post = db.query(models.Post).filter(models.Post.id == post_id).first()
-    db.delete(post)
+    images = db.query(models.Post.images).filter(models.Post.id == post_id).scalar()
+    storage.release(db, images or [])
+    delete_posts(db, [post_id])
+    invalidation.invalidate(db, ('post', post_id))
     db.commit()
     return {"delete": "ok"}
 
 
 def get_comment(db: Session, comment_id: int):
-    comment = db.query(models.Comment).filter(models.Comment.id == comment_id).first()
+    comment = db.query(*models.columns(models.Comment)).filter(models.Comment.id == comment_id).first()
     if comment is not None:
-        return comment.to_dict()
+        return comment._asdict()
     else:
         return None
 
-def get_comments(db: Session, offset: int = 0, limit: int = 100, post_id: int = None):
+def get_comments(db: Session, offset: int = 0, limit: int = 100, post_id: int = None, cursor: str = None):
+    query = db.query(*models.columns(models.Comment))
     if post_id is not None:
-        comments = db.query(models.Comment).filter(models.Comment.post_id==post_id).order_by(desc(models.Comment.time)).offset(offset).limit(limit).all()
-    else:
-        comments = db.query(models.Comment).order_by(desc(models.Comment.time)).offset(offset).limit(limit).all()
-    
-    filtered_comments = []
-    for comment in comments:
-        filtered_comments.append(comment.to_dict())
-    return filtered_comments
+        query = query.filter(models.Comment.post_id==post_id)
+    comments = pagination.keyset(query, (models.Comment.time, models.Comment.id), cursor).offset(offset).limit(limit).all()
+    return [comment._asdict() for comment in comments]
+
+def add_to_counter(db: Session, post_id: int, column, delta: int):
+    """Atomically shifts a denormalized counter of a post inside the current transaction."""
+    # setting time to itself keeps Post.time onupdate from reordering the feed
+    db.query(models.Post).filter(models.Post.id == post_id).update({column: column + delta, models.Post.time: models.Post.time}, synchronize_session=False)
+
+def repair_counters(db: Session):
+    """Recomputes likes_count/comments_count where they drifted, returns the number of fixed posts."""
+    likes = select(func.count(models.Like.id)).where(models.Like.post_id == models.Post.id).scalar_subquery()
+    comments = select(func.count(models.Comment.id)).where(models.Comment.post_id == models.Post.id).scalar_subquery()
+    fixed = db.query(models.Post).filter(or_(models.Post.likes_count != likes, models.Post.comments_count != comments)).update({models.Post.likes_count: likes, models.Post.comments_count: comments, models.Post.version: models.Post.version + 1, models.Post.time: models.Post.time}, synchronize_session=False)
+    invalidation.invalidate_all(db)
+    db.commit()
+    return fixed
 
 def create_comment(db: Session, comment: schemas.CommentCreate):
     db_comment = models.Comment(**comment.dict())
     db.add(db_comment)
+    add_to_counter(db, comment.post_id, models.Post.comments_count, 1)
+    invalidation.invalidate(db, ('post', comment.post_id))
     db.commit()
     db.refresh(db_comment)
     return db_comment.to_dict()
@@ -214,38 +312,53 @@ def update_comment(db: Session, comment: schemas.CommentBase, comment_id: int):
     db_comment = db.query(models.Comment).filter(models.Comment.id == comment_id).first()
     for key, value in comment:
         setattr(db_comment, key, value)
+    invalidation.invalidate(db, ('post', db_comment.post_id))
     db.commit()
     db.refresh(db_comment) 
     return db_comment.to_dict()
 
 def delete_comment(db: Session, comment_id: int):
-    comment = db.query(models.Comment).filter(models.Comment.id == comment_id).first()
-    db.delete(comment)
+    # only the request whose DELETE removed the row decrements, so concurrent deletes count once
+    post_id = db.execute(delete(models.Comment).where(models.Comment.id == comment_id).returning(models.Comment.post_id)).scalar()
+    if post_id is None:
+        db.rollback()
+        return {"delete": "not exist"}
+    add_to_counter(db, post_id, models.Post.comments_count, -1)
+    invalidation.invalidate(db, ('post', post_id))
     db.commit()
     return {"delete": "ok"}
 
 def get_likes(db: Session, post_id: int):
-    # likes = db.query(models.Like).filter(models.Comment.post_id==post_id).count()
-    return db.query(models.Like).filter(models.Like.post_id==post_id).count()
+    return db.query(models.Post.likes_count).filter(models.Post.id==post_id).scalar() or 0
+
+def get_likes_by_ids(db: Session, ids: list, user_id: int = None):
+    """likes_count and the viewer's liked flag of these posts in this order, with one IN query."""
+    found = {post.id: post._asdict() for post in db.query(models.Post.id, models.Post.likes_count, *feed.post_stats(user_id)).filter(models.Post.id.in_(ids))}
+    return [found[post_id] for post_id in ids if post_id in found]
 
 def create_like(db: Session, like: schemas.LikeCreate):
     db_like = models.Like(**like.dict())
     try:
         db.add(db_like)
+        db.flush()
+        add_to_counter(db, like.post_id, models.Post.likes_count, 1)
+        invalidation.invalidate(db, ('post', like.post_id))
         db.commit()
-        db.refresh(db_like)
     except exc.IntegrityError as err:
+        db.rollback()
         return {"like": "exists"}
     return "ok"
 
 def delete_like(db: Session, like: schemas.LikeCreate):
-    try:
-        like_to_delete = db.query(models.Like).filter(models.Like.owner_id == like.owner_id, models.Like.post_id == like.post_id).one()
-        db.delete(like_to_delete)
-        db.commit()
-        return "ok"
-    except exc.NoResultFound as err:
+    # only the request whose DELETE removed the row decrements, so concurrent unlikes count once
+    deleted = db.query(models.Like).filter(models.Like.owner_id == like.owner_id, models.Like.post_id == like.post_id).delete(synchronize_session=False)
+    if deleted != 1:
+        db.rollback()
         return {"delete": "not exist"}
+    add_to_counter(db, like.post_id, models.Post.likes_count, -1)
+    invalidation.invalidate(db, ('post', like.post_id))
+    db.commit()
+    return "ok"
 
 def create_transfer(db: Session, transfer: schemas.TransferCreate, user_id: int):
     db_transfer = models.Transfer(**transfer.dict(), user_id=user_id)
@@ -0,0 +1,56 @@
+"""Resized WebP/JPEG variants of uploaded images.
+
+Variants are rendered in a process pool after the response has been sent and
+stored next to the original, e.g. /static/post_images/<name>_thumb.webp:
+
+    {'thumb': {'webp': '/static/...', 'jpeg': '/static/...'}, 'medium': {...}}
+"""
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageOps
+from database import AsyncSessionLocal
+import aio
+
+WIDTHS = {'thumb': 320, 'medium': 1080}
+FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+QUALITY = int(os.environ.get('IMAGE_QUALITY', 80))
+
+pool = ProcessPoolExecutor(max_workers=int(os.environ.get('IMAGE_WORKERS', os.cpu_count() or 1)))
+
+
+def make_variants(path: str) -> dict:
+    """Renders all variants of the image at public path, runs in a pool worker."""
+    source = path.lstrip('/')
+    base, _ = os.path.splitext(source)
+    variants = {}
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        for name, width in WIDTHS.items():
+            if image.width > width:
+                resized = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+            else:
+                resized = image
+            variants[name] = {}
+            for ext, fmt in FORMATS.items():
+                target = f'{base}_{name}.{ext}'
+                resized.save(target, fmt, quality=QUALITY)
+                variants[name][ext] = '/' + target
+    return variants
+
+
+async def render(paths: list) -> list:
+    loop = asyncio.get_running_loop()
+    return await asyncio.gather(*[loop.run_in_executor(pool, make_variants, path) for path in paths])
+
+
+async def process_pet_image(pet_id: int, path: str):
+    variants, = await render([path])
+    async with AsyncSessionLocal() as db:
+        await aio.crud.set_pet_image_variants(db=db, pet_id=pet_id, variants=variants)
+
+
+async def process_post_images(post_id: int, paths: list):
+    variants = await render(paths)
+    async with AsyncSessionLocal() as db:
+        await aio.crud.set_post_image_variants(db=db, post_id=post_id, variants=variants)
@@ -0,0 +1,114 @@
+"""Home feeds materialized on write.
+
+A pet's new post is copied into feed_items for every user interested in the
+pet: users who liked one of its posts, who sheltered it, and its owner.
+Reading a home feed is then one range of feed_items(user_id, time, post_id).
+
+The copy happens in a background task after the post is created. Pets with
+more than FANOUT_LIMIT interested users are flagged feed_on_read instead:
+their posts are not copied, readers merge them in from posts at read time.
+
+Interest counts from the moment a post is created; liking a pet later does
+not backfill its older posts. `manage.py rebuild-feeds` recomputes feeds
+and flags from scratch.
+"""
+import os
+from datetime import datetime
+from sqlalchemy import exc, func, literal, select, union, union_all
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from database import SessionLocal
+import models, pagination
+
+FANOUT_LIMIT = int(os.environ.get('FEED_FANOUT_LIMIT', 10000))
+
+
+def interests():
+    """(pet_id, user_id) of every user who gets the pet's posts in their feed."""
+    return union(
+        select(models.Post.owner_id.label('pet_id'), models.Like.owner_id.label('user_id')).join(models.Like, models.Like.post_id == models.Post.id),
+        select(models.Shelter.pet_id, models.Shelter.user_id),
+        select(models.Pet.id, models.Pet.owner_id),
+    ).subquery('interests')
+
+
+def followed_on_read(user_id: int):
+    """Ids of the feed_on_read pets the user is interested in."""
+    interest = interests()
+    return (select(models.Pet.id)
+            .where(models.Pet.feed_on_read, models.Pet.id.in_(select(interest.c.pet_id).where(interest.c.user_id == user_id)))
+            .correlate(None))
+
+
+def entries(user_id: int, cursor: str = None, limit: int = 100):
+    """(post_id, time) of the first limit feed entries after cursor, newest first."""
+    fanned_out = select(models.FeedItem.post_id, models.FeedItem.time).where(models.FeedItem.user_id == user_id)
+    fanned_out = pagination.keyset(fanned_out, (models.FeedItem.time, models.FeedItem.post_id), cursor).limit(limit)
+    on_read = select(models.Post.id.label('post_id'), models.Post.time).where(models.Post.owner_id.in_(followed_on_read(user_id)))
+    on_read = pagination.keyset(on_read, (models.Post.time, models.Post.id), cursor).limit(limit)
+    # each side stops after limit rows, their union is sorted again by the caller
+    return union_all(fanned_out, on_read).subquery('entries')
+
+
+def fan_out(db: Session, post_id: int, pet_id: int, time: datetime) -> int:
+    """Copies the post into the feeds of the pet's interested users, returns their number."""
+    on_read = db.query(models.Pet.feed_on_read).filter(models.Pet.id == pet_id).scalar()
+    if on_read is None or on_read:
+        return 0
+    interest = interests()
+    followers = select(interest.c.user_id).where(interest.c.pet_id == pet_id)
+    if db.execute(select(func.count()).select_from(followers.limit(FANOUT_LIMIT + 1).subquery())).scalar() > FANOUT_LIMIT:
+        mark_on_read(db, pet_id)
+        db.commit()
+        return 0
+    try:
+        inserted = db.execute(insert(models.FeedItem)
+                              .from_select(['user_id', 'post_id', 'time'], followers.add_columns(literal(post_id), literal(time, models.FeedItem.time.type)))
+                              .on_conflict_do_nothing()).rowcount
+        db.commit()
+    except exc.IntegrityError:
+        # the post was deleted before its fan-out committed
+        db.rollback()
+        return 0
+    return inserted
+
+
+def mark_on_read(db: Session, pet_id: int):
+    """Stops fanning out the pet's posts and drops the copies made so far."""
+    db.query(models.Pet).filter(models.Pet.id == pet_id).update({models.Pet.feed_on_read: True}, synchronize_session=False)
+    db.query(models.FeedItem).filter(models.FeedItem.post_id.in_(select(models.Post.id).where(models.Post.owner_id == pet_id))).delete(synchronize_session=False)
+
+
+def deliver(post_id: int, pet_id: int, time: datetime):
+    """Background task of a created post."""
+    db = SessionLocal()
+    try:
+        fan_out(db, post_id, pet_id, time)
+    finally:
+        db.close()
+
+
+def rebuild(db: Session, user_id: int = None) -> int:
+    """Recomputes the feeds of all users, or of one, returns the number of feed items.
+
+    A full rebuild also decides again which pets are merged on read. Readers see
+    the old feeds until the transaction commits.
+    """
+    interest = interests()
+    if user_id is None:
+        popular = select(interest.c.pet_id).group_by(interest.c.pet_id).having(func.count() > FANOUT_LIMIT)
+        flagged = models.Pet.id.in_(popular)
+        db.query(models.Pet).filter(models.Pet.feed_on_read != flagged).update({models.Pet.feed_on_read: flagged}, synchronize_session=False)
+        db.query(models.FeedItem).delete(synchronize_session=False)
+    else:
+        db.query(models.FeedItem).filter(models.FeedItem.user_id == user_id).delete(synchronize_session=False)
+    items = (select(interest.c.user_id, models.Post.id, models.Post.time)
+             .select_from(interest)
+             .join(models.Post, models.Post.owner_id == interest.c.pet_id)
+             .join(models.Pet, models.Pet.id == models.Post.owner_id)
+             .where(~models.Pet.feed_on_read))
+    if user_id is not None:
+        items = items.where(interest.c.user_id == user_id)
+    inserted = db.execute(insert(models.FeedItem).from_select(['user_id', 'post_id', 'time'], items)).rowcount
+    db.commit()
+    return inserted
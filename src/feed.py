@@ -0,0 +1,39 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import exists, literal
+import models
+
+
+def liked(user_id: int = None, post=models.Post):
+    if user_id is None:
+        return literal(False).label('liked')
+    return exists().where(models.Like.post_id == post.id, models.Like.owner_id == user_id).label('liked')
+
+
+def is_liked(db: Session, post_id: int, user_id: int = None):
+    if user_id is None:
+        return False
+    return db.query(exists().where(models.Like.post_id == post_id, models.Like.owner_id == user_id)).scalar()
+
+
+def liked_ids(db: Session, post_ids: list, user_id: int = None) -> set:
+    """Ids among post_ids the user liked, with one query."""
+    if user_id is None or not post_ids:
+        return set()
+    return {post_id for post_id, in db.query(models.Like.post_id).filter(models.Like.owner_id == user_id, models.Like.post_id.in_(post_ids))}
+
+
+def post_stats(user_id: int = None, post=models.Post):
+    """Columns to add to a Post query for the viewer's state; counters live on Post itself."""
+    return [liked(user_id, post)]
+
+
+def attach_comments(db: Session, posts: list):
+    """Loads comments of all given post dicts with one query."""
+    if not posts:
+        return posts
+    by_id = {post['id']: post for post in posts}
+    comments = db.query(*models.columns(models.Comment), models.User.username).outerjoin(models.User, models.User.id == models.Comment.owner_id).filter(models.Comment.post_id.in_(by_id.keys())).order_by(models.Comment.id).all()
+    for comment in comments:
+        comment_json = comment._asdict()
+        by_id[comment_json['post_id']].setdefault('comments', []).append(comment_json)
+    return posts
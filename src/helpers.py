@@ -1,22 +1,36 @@
 from sqlalchemy.orm import Session
 
-import models, schemas
+import models, schemas, cache, invalidation, locations
 
-def check_auth(db: Session, auth: schemas.Auth):
-    user = db.query(models.User).filter(models.User.username == auth.username).first()
-    if user is not None:
-        if user.hashed_password == auth.password + "notreallyhashed":
-            return user.id
+def get_credentials(db: Session, username: str):
+    """(id, hashed_password) of the user, None if there is none."""
+    return db.query(models.User.id, models.User.hashed_password).filter(models.User.username == username).first()
+
+def set_password_hash(db: Session, user_id: int, hashed_password: str):
+    db.query(models.User).filter(models.User.id == user_id).update({models.User.hashed_password: hashed_password}, synchronize_session=False)
+    invalidation.invalidate(db, ('user', user_id))
+    db.commit()
 
 def get_user_by_id(db: Session, user_id: int):
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    key = ('user', user_id)
+    user_dict = cache.entities.get(key)
+    if user_dict is not None:
+        return user_dict
+    user = db.query(*models.columns(models.User), *locations.columns()).outerjoin(models.Location, models.Location.id == models.User.location_id).filter(models.User.id == user_id).first()
     if user:
-        user_dict = user.to_dict()
-        if user.pets:
-            user_dict['pets'] = []
-            for pet in user.pets:
-                user_dict['pets'].append(pet.to_dict())
+        user_dict = user._asdict()
+        pets = db.query(*models.columns(models.Pet)).filter(models.Pet.owner_id == user_id).order_by(models.Pet.id).all()
+        if pets:
+            user_dict['pets'] = [pet._asdict() for pet in pets]
+        cache.entities.set(key, user_dict)
         return user_dict
     else:
         return user
-    
\ No newline at end of file
+    
+def get_user_versions(db: Session, user_id: int):
+    """What conditional.user_tag needs of the user, from the cache or one small query; None if there is no user."""
+    user = cache.entities.get(('user', user_id))
+    if user is not None:
+        return user
+    user = db.query(models.User.id, models.User.version).filter(models.User.id == user_id).first()
+    return user._asdict() if user else None
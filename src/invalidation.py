@@ -0,0 +1,128 @@
+"""Cache invalidation shared by all workers through Postgres LISTEN/NOTIFY.
+
+Write paths call invalidate(db, *keys) before committing. The keys go out
+with pg_notify inside the same transaction, so Postgres delivers them only
+if the write commits, and are evicted from this process's cache right after
+the commit. Every worker runs a Listener that evicts the keys published by
+the others.
+
+The same statement bumps the version column of the invalidated users, pets
+and posts, so a version moves exactly when a cached representation goes
+stale; conditional GETs compare those versions.
+"""
+import json
+import logging
+import select as _select
+import threading
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from sqlalchemy import event, func, select, text, update
+from sqlalchemy.orm import Session
+from database import engine
+import cache, models
+
+CHANNEL = 'cache_invalidation'
+EVERYTHING = '*'
+# longest wait between reconnects, in seconds
+MAX_BACKOFF = 30
+# errors of a lost or refused connection, anything else is a bug
+CONNECTION_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError, OSError)
+
+# key kind -> model whose version column moves with the key
+VERSIONED = {'user': models.User, 'pet': models.Pet, 'post': models.Post}
+
+logger = logging.getLogger(__name__)
+
+
+def invalidate(db: Session, *keys):
+    notify = select(func.pg_notify(CHANNEL, json.dumps(keys)))
+    for kind, model in VERSIONED.items():
+        ids = [key[1] for key in keys if key[0] == kind]
+        if ids:
+            # columns with an onupdate, like posts.time, keep their value: a version bump is no edit
+            kept = {column.name: column for column in model.__table__.columns if column.onupdate is not None}
+            notify = notify.add_cte(update(model).where(model.id.in_(ids)).values(version=model.version + 1, **kept).cte(f'bumped_{model.__tablename__}'))
+    db.execute(notify)
+    db.info.setdefault('invalidate', []).extend(keys)
+
+
+def invalidate_all(db: Session):
+    db.execute(text("SELECT pg_notify(:channel, :payload)"), {'channel': CHANNEL, 'payload': json.dumps(EVERYTHING)})
+    db.info.setdefault('invalidate', []).append(EVERYTHING)
+
+
+def evict(keys):
+    if keys == EVERYTHING or EVERYTHING in keys:
+        cache.entities.clear()
+    else:
+        cache.entities.invalidate(*[tuple(key) for key in keys])
+
+
+@event.listens_for(Session, 'after_commit')
+def _evict_committed(session):
+    keys = session.info.pop('invalidate', None)
+    if keys:
+        evict(keys)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_rolled_back(session):
+    session.info.pop('invalidate', None)
+
+
+class Listener(threading.Thread):
+    """Evicts keys published by other workers until stop() is called.
+
+    Lost connections are retried with a growing delay; any other error is
+    logged and ends the thread.
+    """
+
+    def __init__(self, poll_interval: float = 1.0):
+        super().__init__(name='cache-invalidation', daemon=True)
+        self.poll_interval = poll_interval
+        # set while LISTEN is active
+        self.listening = threading.Event()
+        self._stopped = threading.Event()
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self):
+        backoff = self.poll_interval
+        while not self._stopped.is_set():
+            conn = None
+            try:
+                # the whole URL, so query options like sslmode reach libpq too
+                conn = psycopg2.connect(engine.url.set(drivername='postgresql').render_as_string(hide_password=False))
+                conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+                conn.cursor().execute(f'LISTEN {CHANNEL}')
+                # notifications sent while we were not listening are lost
+                cache.entities.clear()
+                self.listening.set()
+                backoff = self.poll_interval
+                self._listen(conn)
+            except CONNECTION_ERRORS:
+                logger.exception('cache invalidation listener lost its connection, reconnecting in %ss', backoff)
+                self._stopped.wait(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF)
+            except Exception:
+                logger.critical('cache invalidation listener failed, this worker no longer evicts keys of others', exc_info=True)
+                raise
+            finally:
+                self.listening.clear()
+                if conn is not None:
+                    conn.close()
+
+    def _listen(self, conn):
+        while not self._stopped.is_set():
+            if _select.select([conn], [], [], self.poll_interval) == ([], [], []):
+                continue
+            conn.poll()
+            while conn.notifies:
+                payload = conn.notifies.pop(0).payload
+                try:
+                    keys = json.loads(payload)
+                except ValueError:
+                    logger.error('ignoring malformed cache invalidation payload: %r', payload)
+                    continue
+                evict(keys)
@@ -0,0 +1,74 @@
+"""Normalized places of users and radius search over them.
+
+Users point at a row of locations instead of carrying free-text country,
+state and city. Names are normalized before they are looked up or stored,
+so "kyiv " and "Kyiv" are one place; coordinates come from a gazetteer
+loaded with `manage.py import locations`.
+
+Radius search first cuts a latitude/longitude box out of
+ix_locations_latitude_longitude and only then computes the great-circle
+distance, for the few places inside the box.
+"""
+import math
+from sqlalchemy import func, literal_column, or_, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+import models
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 2 * math.pi * EARTH_RADIUS_KM / 360
+
+# expressions of the unique place index, NULL parts compare equal; the
+# literal keeps ON CONFLICT inference working with server-side parameters
+EMPTY = literal_column("''")
+PLACE = (func.coalesce(models.Location.country, EMPTY), func.coalesce(models.Location.state, EMPTY), func.coalesce(models.Location.city, EMPTY))
+
+
+def normalize(name: str | None) -> str | None:
+    if name is None:
+        return None
+    name = ' '.join(name.split()).title()
+    return name or None
+
+
+def columns():
+    """Place columns to add to a query that outer joins Location."""
+    return (models.Location.country, models.Location.state, models.Location.city)
+
+
+def resolve(db: Session, country: str | None, state: str | None, city: str | None) -> int | None:
+    """Id of the place, created without coordinates if it is new."""
+    place = normalize(country), normalize(state), normalize(city)
+    if not any(place):
+        return None
+    country, state, city = place
+    db.execute(insert(models.Location).values(country=country, state=state, city=city).on_conflict_do_nothing(index_elements=PLACE))
+    return db.query(models.Location.id).filter(*[part == (value or '') for part, value in zip(PLACE, place)]).scalar()
+
+
+def bounding_box(latitude: float, longitude: float, radius_km: float):
+    """(min_lat, max_lat, min_lon, max_lon) around the point; longitudes may leave [-180, 180]."""
+    dlat = radius_km / KM_PER_DEGREE
+    dlon = min(180.0, radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 1e-9)))
+    return latitude - dlat, latitude + dlat, longitude - dlon, longitude + dlon
+
+
+def distance_km(latitude: float, longitude: float):
+    """Haversine distance from the point to a location, as an SQL expression."""
+    lat, lon = models.Location.latitude, models.Location.longitude
+    a = (func.power(func.sin(func.radians(lat - latitude) / 2), 2)
+         + math.cos(math.radians(latitude)) * func.cos(func.radians(lat)) * func.power(func.sin(func.radians(lon - longitude) / 2), 2))
+    return 2 * EARTH_RADIUS_KM * func.asin(func.sqrt(a))
+
+
+def near(latitude: float, longitude: float, radius_km: float):
+    """Ids of the locations within radius_km of the point."""
+    min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius_km)
+    if min_lon < -180 or max_lon > 180:
+        # the box crosses the antimeridian
+        in_box = or_(models.Location.longitude >= (min_lon + 540) % 360 - 180, models.Location.longitude <= (max_lon + 540) % 360 - 180)
+    else:
+        in_box = models.Location.longitude.between(min_lon, max_lon)
+    return (select(models.Location.id)
+            .where(models.Location.latitude.between(min_lat, max_lat), in_box, distance_km(latitude, longitude) <= radius_km)
+            .correlate(None))
@@ -1,32 +1,45 @@
 import re
 import inspect
-import uuid
 import os
-import aiofiles
 from datetime import date
-from fastapi import FastAPI, HTTPException, Depends, Request, File, UploadFile, Form
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Depends, Request, Response, BackgroundTasks, File, UploadFile, Form, Query
+from fastapi.responses import JSONResponse, ORJSONResponse
 from fastapi_jwt_auth import AuthJWT
 from fastapi.openapi.utils import get_openapi
 from fastapi.routing import APIRoute
 from fastapi_jwt_auth.exceptions import AuthJWTException
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
-import crud, models, schemas, helpers, search
-from database import SessionLocal, engine
+from sqlalchemy.ext.asyncio import AsyncSession
+import crud, models, schemas, helpers, search, pagination, aio, cache, invalidation, derivatives, uploads, static, metrics, sqlbudget, passwords, responses, fanout, conditional
+import database
+from database import SessionLocal, AsyncSessionLocal, engine, async_engine
 from typing import List, Optional
 
 
 IMAGES_PET_AVATARS = 'static/pet_avatars/'
 IMAGES_POST_IMAGES = 'static/post_images/'
-IMAGES_PUBLIC_URL = 'https://api2.adoptpets.click'
+# ids of one batch read, e.g. GET /pets?ids=3,1,2
+BATCH_IDS = r'^\d+(,\d+)*$'
+MAX_BATCH_IDS = 100
 
-models.Base.metadata.create_all(bind=engine)
+app = FastAPI(default_response_class=ORJSONResponse)
 
-app = FastAPI()
+app.add_middleware(uploads.LimitUploadSize)
+app.add_middleware(sqlbudget.SQLBudgetMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/static", static.ImmutableStaticFiles(directory="static"), name="static")
+
+invalidation_listener = invalidation.Listener()
+
+@app.on_event("startup")
+def start_invalidation_listener():
+    invalidation_listener.start()
+
+@app.on_event("shutdown")
+def stop_invalidation_listener():
+    invalidation_listener.stop()
 
 # Dependency
 def get_db():
@@ -36,6 +49,10 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 class Settings(BaseModel):
     authjwt_secret_key: str = "secret"
 
@@ -50,17 +67,58 @@ def authjwt_exception_handler(request: Request, exc: AuthJWTException):
         content={"detail": exc.message}
     )
 
+@app.exception_handler(pagination.InvalidCursor)
+def invalid_cursor_exception_handler(request: Request, exc: pagination.InvalidCursor):
+    return JSONResponse(
+        status_code=400,
+        content={"detail": "Invalid cursor"}
+    )
+
+def set_next_cursor(response: Response, items: list, limit: int, *keys):
+    cursor = pagination.next_cursor(items, limit, *keys)
+    if cursor is not None:
+        response.headers['X-Next-Cursor'] = cursor
+
+def parse_ids(ids: str) -> list:
+    """Ids of a batch read without repeats, in the order given."""
+    unique = list(dict.fromkeys(int(part) for part in ids.split(',')))
+    if len(unique) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=422, detail=f"At most {MAX_BATCH_IDS} ids per request")
+    return unique
+
+def page_not_modified(request: Request, response: Response, limit: int, versions):
+    """304 when the client has the current page of posts, else None; versions() loads the page's versions."""
+    # pages carry the viewer's liked flags
+    response.headers['Vary'] = 'Authorization'
+    if not conditional.requested(request):
+        return None
+    page = versions()
+    if conditional.current(request, response, conditional.page_tag(page)):
+        set_next_cursor(response, page, limit, 'time', 'id')
+        return conditional.not_modified(response)
+    return None
+
+def respond_page(response: Response, posts: list, limit: int):
+    set_next_cursor(response, posts, limit, 'time', 'id')
+    response.headers['ETag'] = conditional.page_tag(posts)
+    return responses.respond(posts, schemas.Post, response)
+
 @app.post('/auth/login')
-def auth_login(auth: schemas.Auth, Authorize: AuthJWT = Depends(), db: Session = Depends(get_db)):
-    user_id = helpers.check_auth(db, auth)
-    if not user_id:
+@sqlbudget.budget(3)
+async def auth_login(auth: schemas.Auth, Authorize: AuthJWT = Depends(), db: AsyncSession = Depends(get_async_db)):
+    credentials = await aio.helpers.get_credentials(db, auth.username)
+    # verify runs for unknown users too, so response times do not tell which usernames exist
+    verified = await passwords.verify_async(credentials.hashed_password if credentials is not None else None, auth.password)
+    if credentials is None or not verified:
         raise HTTPException(status_code=401,detail="Bad username or password")
-    else:
-        access_token = Authorize.create_access_token(subject=user_id)
-        refresh_token = Authorize.create_refresh_token(subject=user_id)
+    if passwords.needs_rehash(credentials.hashed_password):
+        await aio.helpers.set_password_hash(db, credentials.id, await passwords.hash_async(auth.password))
+    access_token = Authorize.create_access_token(subject=credentials.id)
+    refresh_token = Authorize.create_refresh_token(subject=credentials.id)
     return {"access": access_token, "refresh": refresh_token}
 
 @app.post('/auth/refresh')
+@sqlbudget.budget(0)
 def refresh(Authorize: AuthJWT = Depends()):
     """
     The jwt_refresh_token_required() function insures a valid refresh
@@ -75,40 +133,50 @@ def refresh(Authorize: AuthJWT = Depends()):
     return {"access": new_access_token}
 
 @app.post('/users', response_model=schemas.User)
-def user_add(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    return crud.create_user(db=db, user=user)
+@sqlbudget.budget(2)
+async def user_add(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    hashed_password = await passwords.hash_async(user.password)
+    return await aio.crud.create_user(db, user=user, hashed_password=hashed_password)
 
 @app.get('/users/me', response_model=schemas.User)
-def user_me(Authorize: AuthJWT = Depends(), db: Session = Depends(get_db)):
+@sqlbudget.budget(3)
+def user_me(request: Request, response: Response, Authorize: AuthJWT = Depends(), db: Session = Depends(get_db)):
     Authorize.jwt_required()
-    user = helpers.get_user_by_id(db, Authorize.get_jwt_subject())
+    user_id = Authorize.get_jwt_subject()
+    response.headers['Vary'] = 'Authorization'
+    if conditional.requested(request):
+        versions = helpers.get_user_versions(db, user_id)
+        if versions is not None and conditional.current(request, response, conditional.user_tag(versions)):
+            return conditional.not_modified(response)
+    user = helpers.get_user_by_id(db, user_id)
     if user is not None:
-        if 'pets' in user:
-            for i in range(len(user['pets'])):
-                if user['pets'][i]['image'] is not None:
-                    user['pets'][i]['image'] = IMAGES_PUBLIC_URL + user['pets'][i]['image']
-        return user
+        response.headers['ETag'] = conditional.user_tag(user)
+        return responses.respond(user, schemas.User, response)
     else:
         raise HTTPException(status_code=401, detail="Something went wrong")        
 
 @app.get('/users/{user_id}', response_model=schemas.User)
-def user_get(user_id: int, db: Session = Depends(get_db)):
+@sqlbudget.budget(3)
+def user_get(user_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
+    if conditional.requested(request):
+        versions = helpers.get_user_versions(db, user_id)
+        if versions is not None and conditional.current(request, response, conditional.user_tag(versions)):
+            return conditional.not_modified(response)
     user = helpers.get_user_by_id(db, user_id)
     if user is not None:
-        if 'pets' in user:
-            for i in range(len(user['pets'])):
-                if user['pets'][i]['image'] is not None:
-                    user['pets'][i]['image'] = IMAGES_PUBLIC_URL + user['pets'][i]['image']
-        return user
+        response.headers['ETag'] = conditional.user_tag(user)
+        return responses.respond(user, schemas.User, response)
     else:
         raise HTTPException(status_code=404, detail="User not found") 
 
 @app.put("/users/me", response_model=schemas.UserUpdate)
+@sqlbudget.budget(7)
 def user_me_update(user: schemas.UserUpdate, db: Session = Depends(get_db), Authorize: AuthJWT = Depends()):
     Authorize.jwt_required()
     return crud.update_user(db=db, user=user, user_id=Authorize.get_jwt_subject())
 
 @app.post("/users/me/shelter/clean", response_model=dict)
+@sqlbudget.budget(2)
 def user_shelter_clean(db: Session = Depends(get_db), Authorize: AuthJWT = Depends()):
     Authorize.jwt_required()
     user_id=Authorize.get_jwt_subject()
@@ -116,49 +184,47 @@ def user_shelter_clean(db: Session = Depends(get_db), Authorize: AuthJWT = Depen
     return crud.delete_shelter(db=db, user_id=user_id)
 
 @app.post('/pets', response_model=schemas.Pet)
-async def pets_add(name: str = Form(...), description: str = Form(...), sex: str = Form(...), species: str = Form(...), birth_date: date = Form(...), has_home: bool = Form(...), image: UploadFile | None = None, Authorize: AuthJWT = Depends(), db: Session = Depends(get_db)):
+@sqlbudget.budget(8)
+async def pets_add(background_tasks: BackgroundTasks, name: str = Form(...), description: str = Form(...), sex: str = Form(...), species: str = Form(...), birth_date: date = Form(...), has_home: bool = Form(...), image: UploadFile | None = None, Authorize: AuthJWT = Depends(), db: AsyncSession = Depends(get_async_db)):
     Authorize.jwt_required()
-    file = image
-    if not file:
+    if not image:
         avatar = None
-        pass
     else:
-        if file.content_type not in ['image/jpeg', 'image/png']:
-            raise HTTPException(status_code=406, detail="Only .jpeg or .png  files allowed")
-        _, ext = os.path.splitext(file.filename)
-        file_name = f'{uuid.uuid4().hex}{ext}'
-        async with aiofiles.open(IMAGES_PET_AVATARS + file_name, 'wb') as f:
-            while content := await file.read(1024):  # async read chunk
-                await f.write(content)  # async write chunk        
-        
-        avatar = '/' + IMAGES_PET_AVATARS + file_name
-    
+        uploaded = await uploads.save_all([image], IMAGES_PET_AVATARS)
+        [avatar] = await aio.storage.add_all(db=db, directory=IMAGES_PET_AVATARS, uploads=uploaded)
+
     pet = schemas.PetCreate(name=name, description=description, sex=sex, species=species, birth_date=birth_date, has_home=has_home, image=avatar)
-    created_pet = crud.create_pet(db=db, pet=pet, user_id=Authorize.get_jwt_subject())
+    created_pet = await aio.crud.create_pet(db=db, pet=pet, user_id=Authorize.get_jwt_subject())
     if created_pet['image'] is not None:
-        created_pet['image'] = IMAGES_PUBLIC_URL + created_pet['image']
-    return created_pet
+        background_tasks.add_task(derivatives.process_pet_image, created_pet['id'], created_pet['image'])
+    return responses.respond(created_pet, schemas.Pet)
 
 @app.get('/pets', response_model=list[schemas.Pet])
-def pets_get(offset: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    pets = crud.get_pets(db=db, offset=offset, limit=limit)
-    for i in range(len(pets)):
-        if pets[i]['image'] is not None:
-            pets[i]['image'] = IMAGES_PUBLIC_URL + pets[i]['image']
-    return pets
+@sqlbudget.budget(1)
+def pets_get(response: Response, offset: int = 0, limit: int = 100, cursor: str | None = None, ids: str | None = Query(None, regex=BATCH_IDS, description='comma separated ids, pets come back in this order'), db: Session = Depends(get_db)):
+    if ids is not None:
+        return responses.respond(crud.get_pets_by_ids(db=db, ids=parse_ids(ids)), schemas.Pet)
+    pets = crud.get_pets(db=db, offset=offset, limit=limit, cursor=cursor)
+    set_next_cursor(response, pets, limit, 'id')
+    return responses.respond(pets, schemas.Pet, response)
 
 @app.get('/pets/{pet_id}', response_model=schemas.Pet)
-def pet_get(pet_id: int, db: Session = Depends(get_db)):
+@sqlbudget.budget(2)
+def pet_get(pet_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
+    if conditional.requested(request):
+        versions = crud.get_pet_versions(db=db, pet_id=pet_id)
+        if versions is not None and conditional.current(request, response, conditional.pet_tag(versions)):
+            return conditional.not_modified(response)
     pet = crud.get_pet(db=db, pet_id=pet_id)
-    if pet is not None:
-        if 'image' in pet:
-            pet['image'] = IMAGES_PUBLIC_URL + pet['image']
-        return pet
+    if pet:
+        response.headers['ETag'] = conditional.pet_tag(pet)
+        return responses.respond(pet, schemas.Pet, response)
     else:
         raise HTTPException(status_code=404, detail="Pet with such id not found")
 
 
 @app.put("/pets/{pet_id}", response_model=schemas.Pet)
+@sqlbudget.budget(5)
 def pet_update(pet_id: int, pet: schemas.PetUpdate, db: Session = Depends(get_db), Authorize: AuthJWT = Depends()):
     Authorize.jwt_required()
     pet_by_id = crud.get_pet(db=db, pet_id=pet_id)
@@ -168,73 +234,59 @@ def pet_update(pet_id: int, pet: schemas.PetUpdate, db: Session = Depends(get_db
         raise HTTPException(status_code=422, detail="Wrong owner of pet")   
 
     if updated_pet is not None:
-        if updated_pet['image'] is not None:
-            updated_pet['image'] = IMAGES_PUBLIC_URL + updated_pet['image']
-        return updated_pet
+        return responses.respond(updated_pet, schemas.Pet)
     else:
         raise HTTPException(status_code=404, detail="Pet with such id not found")
      
 @app.delete('/pets/{pet_id}', response_model=dict)
-async def pets_delete(pet_id: int, Authorize: AuthJWT = Depends(), db: Session = Depends(get_db)):
+@sqlbudget.budget(13)
+async def pets_delete(pet_id: int, Authorize: AuthJWT = Depends(), db: AsyncSession = Depends(get_async_db)):
     Authorize.jwt_required()
-    pet_source = crud.get_pet(pet_id=pet_id, db=db)
+    pet_source = await aio.crud.get_pet(pet_id=pet_id, db=db)
     if not pet_source:
         raise HTTPException(status_code=404, detail="Pet not found")
     if pet_source['owner_id'] == Authorize.get_jwt_subject():
-        return crud.delete_pet(db=db, pet_id=pet_id)
+        return await aio.crud.delete_pet(db=db, pet_id=pet_id)
     else:
         raise HTTPException(status_code=401, detail="You're not owner of pet to remove")
 
 
 @app.post('/pets/{pet_id}/posts', response_model=schemas.Post)
-async def pet_posts_add(pet_id: int, text: Optional[str] = Form(None), image_files: List[UploadFile] = File(...), Authorize: AuthJWT = Depends(), db: Session = Depends(get_db)):
+@sqlbudget.budget(12)
+async def pet_posts_add(pet_id: int, background_tasks: BackgroundTasks, text: Optional[str] = Form(None), image_files: List[UploadFile] = File(...), Authorize: AuthJWT = Depends(), db: AsyncSession = Depends(get_async_db)):
     Authorize.jwt_required()
-    images = []
     if image_files is None:
         raise HTTPException(status_code=422, detail="You cannot create post without images")
-    else:
-        for image_file in image_files:
-            if image_file.content_type not in ['image/jpeg', 'image/png']:
-                pass
-            else:
-                _, ext = os.path.splitext(image_file.filename)
-                file_name = f'{uuid.uuid4().hex}{ext}'
-                async with aiofiles.open(IMAGES_POST_IMAGES + file_name, 'wb') as f:
-                    while content := await image_file.read(1024):  # async read chunk
-                        await f.write(content)  # async write chunk        
-                
-                images.append('/' + IMAGES_POST_IMAGES + file_name)
-    
-    # check if pet is owned by user
-    pet_by_id = pet_get(pet_id, db)
+
+    # check if pet is owned by user before anything is written to disk
+    pet_by_id = await aio.crud.get_pet(db=db, pet_id=pet_id)
 
     if 'owner_id' in pet_by_id and pet_by_id['owner_id'] == Authorize.get_jwt_subject():
+        uploaded = await uploads.save_all(image_files, IMAGES_POST_IMAGES, skip_invalid=True)
+        images = await aio.storage.add_all(db=db, directory=IMAGES_POST_IMAGES, uploads=uploaded)
         post = schemas.PostCreate(text=text, images=images)
-        created_post = crud.create_post(db=db, post=post, owner_id=pet_id)
-        if 'images' in created_post:
-            for i in range(len(created_post['images'])):
-                created_post['images'][i] = IMAGES_PUBLIC_URL + created_post['images'][i]
-        if 'avatar' in created_post:
-            created_post['avatar'] = IMAGES_PUBLIC_URL + created_post['avatar']
-        return created_post
+        created_post = await aio.crud.create_post(db=db, post=post, owner_id=pet_id)
+        if created_post['images']:
+            background_tasks.add_task(derivatives.process_post_images, created_post['id'], list(created_post['images']))
+        background_tasks.add_task(fanout.deliver, created_post['id'], pet_id, created_post['time'])
+        return responses.respond(created_post, schemas.Post)
     else:
         raise HTTPException(status_code=422, detail="Wrong owner of pet")
 
 @app.get('/pets/{pet_id}/posts', response_model=List[schemas.Post])
-def pet_posts_get(pet_id: int, offset: int = 0, limit: int = 100, Authorize: AuthJWT = Depends(), db: Session = Depends(get_db)):
+@sqlbudget.budget(3)
+def pet_posts_get(pet_id: int, request: Request, response: Response, offset: int = 0, limit: int = 100, cursor: str | None = None, Authorize: AuthJWT = Depends(), db: Session = Depends(get_db)):
     Authorize.jwt_optional()
     user_id = Authorize.get_jwt_subject() or None
 
-    posts = crud.get_posts(db=db, pet_id=pet_id, offset=offset, limit=limit, user_id=user_id)
-    if posts:
-        for p in range(len(posts)):
-            for i in range(len(posts[p]['images'])):
-                posts[p]['images'][i] = IMAGES_PUBLIC_URL + posts[p]['images'][i]
-            if 'avatar' in posts[p]:
-                posts[p]['avatar'] = IMAGES_PUBLIC_URL + posts[p]['avatar']
-    return posts
+    not_modified = page_not_modified(request, response, limit, lambda: crud.get_posts_versions(db=db, pet_id=pet_id, offset=offset, limit=limit, user_id=user_id, cursor=cursor))
+    if not_modified is not None:
+        return not_modified
+    posts = crud.get_posts(db=db, pet_id=pet_id, offset=offset, limit=limit, user_id=user_id, cursor=cursor)
+    return respond_page(response, posts, limit)
 
 @app.post('/pets/{pet_id}/add_to_shelter', response_model=schemas.Shelter)
+@sqlbudget.budget(3)
 def pet_add_to_shelter(pet_id: int, Authorize: AuthJWT = Depends(), db: Session = Depends(get_db)):
     Authorize.jwt_required()
     user_id = Authorize.get_jwt_subject()
@@ -248,66 +300,90 @@ def pet_add_to_shelter(pet_id: int, Authorize: AuthJWT = Depends(), db: Session
         raise HTTPException(status_code=404, detail="Pet with such id not found")
 
 @app.get('/posts', response_model=List[schemas.Post])
-def posts_get(offset: int = 0, limit: int = 100, Authorize: AuthJWT = Depends(), db: Session = Depends(get_db)):
+@sqlbudget.budget(3)
+def posts_get(request: Request, response: Response, offset: int = 0, limit: int = 100, cursor: str | None = None, ids: str | None = Query(None, regex=BATCH_IDS, description='comma separated ids, posts come back in this order'), Authorize: AuthJWT = Depends(), db: Session = Depends(get_db)):
     Authorize.jwt_optional()
     user_id = Authorize.get_jwt_subject() or None
-    posts = crud.get_posts(db=db, offset=offset, limit=limit, user_id=user_id)
-    if posts:
-        for p in range(len(posts)):
-            for i in range(len(posts[p]['images'])):
-                posts[p]['images'][i] = IMAGES_PUBLIC_URL + posts[p]['images'][i]
-            if 'avatar' in posts[p]:
-                posts[p]['avatar'] = IMAGES_PUBLIC_URL + posts[p]['avatar']
-    return posts
+    if ids is not None:
+        response.headers['Vary'] = 'Authorization'
+        return responses.respond(crud.get_posts_by_ids(db=db, ids=parse_ids(ids), user_id=user_id), schemas.Post, response)
+    not_modified = page_not_modified(request, response, limit, lambda: crud.get_posts_versions(db=db, offset=offset, limit=limit, user_id=user_id, cursor=cursor))
+    if not_modified is not None:
+        return not_modified
+    posts = crud.get_posts(db=db, offset=offset, limit=limit, user_id=user_id, cursor=cursor)
+    return respond_page(response, posts, limit)
 
 @app.get('/posts/liked', response_model=List[schemas.Post])
-def posts_get_liked(offset: int = 0, limit: int = 100, Authorize: AuthJWT = Depends(), db: Session = Depends(get_db)):
+@sqlbudget.budget(3)
+def posts_get_liked(request: Request, response: Response, offset: int = 0, limit: int = 100, cursor: str | None = None, Authorize: AuthJWT = Depends(), db: Session = Depends(get_db)):
     Authorize.jwt_required()
     user_id = Authorize.get_jwt_subject() or None
     if user_id is not None:
-        posts = crud.get_posts(db=db, offset=offset, limit=limit, user_id=user_id, liked=True)
-        if posts:
-            for p in range(len(posts)):
-                for i in range(len(posts[p]['images'])):
-                    posts[p]['images'][i] = IMAGES_PUBLIC_URL + posts[p]['images'][i]
-                if 'avatar' in posts[p]:
-                    posts[p]['avatar'] = IMAGES_PUBLIC_URL + posts[p]['avatar']
-        return posts
+        not_modified = page_not_modified(request, response, limit, lambda: crud.get_posts_versions(db=db, offset=offset, limit=limit, user_id=user_id, liked=True, cursor=cursor))
+        if not_modified is not None:
+            return not_modified
+        posts = crud.get_posts(db=db, offset=offset, limit=limit, user_id=user_id, liked=True, cursor=cursor)
+        return respond_page(response, posts, limit)
     else:
         raise HTTPException(status_code=403, detail="Wrong user")
 
+@app.get('/posts/feed', response_model=List[schemas.Post])
+@sqlbudget.budget(3)
+def posts_get_feed(request: Request, response: Response, offset: int = 0, limit: int = 100, cursor: str | None = None, Authorize: AuthJWT = Depends(), db: Session = Depends(get_db)):
+    Authorize.jwt_required()
+    user_id = Authorize.get_jwt_subject()
+    not_modified = page_not_modified(request, response, limit, lambda: crud.get_feed_versions(db=db, user_id=user_id, offset=offset, limit=limit, cursor=cursor))
+    if not_modified is not None:
+        return not_modified
+    posts = crud.get_feed(db=db, user_id=user_id, offset=offset, limit=limit, cursor=cursor)
+    return respond_page(response, posts, limit)
+
+@app.get('/posts/likes', response_model=List[schemas.PostLikes])
+@sqlbudget.budget(1)
+def posts_get_likes(response: Response, ids: str = Query(..., regex=BATCH_IDS, description='comma separated post ids, counts come back in this order'), Authorize: AuthJWT = Depends(), db: Session = Depends(get_db)):
+    Authorize.jwt_optional()
+    user_id = Authorize.get_jwt_subject() or None
+    response.headers['Vary'] = 'Authorization'
+    return responses.respond(crud.get_likes_by_ids(db=db, ids=parse_ids(ids), user_id=user_id), schemas.PostLikes, response)
+
 @app.get('/posts/{post_id}', response_model=schemas.Post)
-def posts_get(post_id: int, Authorize: AuthJWT = Depends(), db: Session = Depends(get_db)):
+@sqlbudget.budget(3)
+def posts_get(post_id: int, request: Request, response: Response, Authorize: AuthJWT = Depends(), db: Session = Depends(get_db)):
     Authorize.jwt_optional()
     user_id = Authorize.get_jwt_subject() or None
+    response.headers['Vary'] = 'Authorization'
 
+    if conditional.requested(request):
+        versions = crud.get_post_versions(db=db, post_id=post_id, user_id=user_id)
+        if versions is not None and conditional.current(request, response, conditional.post_tag(versions)):
+            return conditional.not_modified(response)
     post = crud.get_post(db=db, post_id=post_id, user_id=user_id)
     if post:
-        for i in range(len(post['images'])):
-            post['images'][i] = IMAGES_PUBLIC_URL + post['images'][i]
-        if 'avatar' in post:
-            post['avatar'] = IMAGES_PUBLIC_URL + post['avatar']
-        return post
+        response.headers['ETag'] = conditional.post_tag(post)
+        return responses.respond(post, schemas.Post, response)
     else:
         raise HTTPException(status_code=404, detail="Post not found")
 
 @app.delete('/posts/{post_id}', response_model=dict)
-async def posts_delete(post_id: int, Authorize: AuthJWT = Depends(), db: Session = Depends(get_db)):
+@sqlbudget.budget(12)
+async def posts_delete(post_id: int, Authorize: AuthJWT = Depends(), db: AsyncSession = Depends(get_async_db)):
     Authorize.jwt_required()
-    post_source = crud.get_post(post_id=post_id, db=db)
+    post_source = await aio.crud.get_post(post_id=post_id, db=db)
     if not post_source:
         raise HTTPException(status_code=404, detail="Post not found")
-    pet_source = crud.get_pet(pet_id=post_source['owner_id'], db=db)
+    pet_source = await aio.crud.get_pet(pet_id=post_source['owner_id'], db=db)
     if pet_source['owner_id'] == Authorize.get_jwt_subject():
-        return crud.delete_post(db=db, post_id=post_id)
+        return await aio.crud.delete_post(db=db, post_id=post_id)
     else:
         raise HTTPException(status_code=401, detail="You're not owner of post to remove")
 
 @app.get('/posts/{post_id}/likes', response_model=int)
+@sqlbudget.budget(1)
 def posts_get(post_id: int, db: Session = Depends(get_db)):
     return crud.get_likes(db=db, post_id=post_id)
 
 @app.post('/posts/{post_id}/like', response_model=dict)
+@sqlbudget.budget(3)
 def posts_like(post_id: int, Authorize: AuthJWT = Depends(), db: Session = Depends(get_db)):
     Authorize.jwt_required()
     like = schemas.LikeCreate(owner_id=Authorize.get_jwt_subject(), post_id=post_id)
@@ -318,6 +394,7 @@ def posts_like(post_id: int, Authorize: AuthJWT = Depends(), db: Session = Depen
         raise HTTPException(status_code=403, detail=result)
 
 @app.delete('/posts/{post_id}/like', response_model=dict)
+@sqlbudget.budget(4)
 def posts_get(post_id: int, Authorize: AuthJWT = Depends(), db: Session = Depends(get_db)):
     Authorize.jwt_required()
     like = schemas.LikeCreate(owner_id=Authorize.get_jwt_subject(), post_id=post_id)
@@ -328,42 +405,50 @@ def posts_get(post_id: int, Authorize: AuthJWT = Depends(), db: Session = Depend
         raise HTTPException(status_code=404, detail=result)
 
 @app.get('/comments', response_model=List[schemas.Comment])
-def comments_get(offset: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_comments(db=db, offset=offset, limit=limit)
+@sqlbudget.budget(1)
+def comments_get(response: Response, offset: int = 0, limit: int = 100, cursor: str | None = None, db: Session = Depends(get_db)):
+    comments = crud.get_comments(db=db, offset=offset, limit=limit, cursor=cursor)
+    set_next_cursor(response, comments, limit, 'time', 'id')
+    return responses.respond(comments, schemas.Comment, response)
 
 @app.post('/comments', response_model=schemas.Comment)
-async def comments_add(comment: schemas.CommentCreate, Authorize: AuthJWT = Depends(), db: Session = Depends(get_db)):
+@sqlbudget.budget(4)
+async def comments_add(comment: schemas.CommentCreate, Authorize: AuthJWT = Depends(), db: AsyncSession = Depends(get_async_db)):
     Authorize.jwt_required()
     comment.owner_id = Authorize.get_jwt_subject()
-    return crud.create_comment(db=db, comment=comment)
+    return await aio.crud.create_comment(db=db, comment=comment)
 
 @app.get('/comments/{comment_id}', response_model=schemas.Comment)
+@sqlbudget.budget(1)
 def comment_get(comment_id: int, db: Session = Depends(get_db)):
     return crud.get_comment(db=db, comment_id=comment_id)
 
 @app.put('/comments/{comment_id}', response_model=schemas.Comment)
-async def comments_update(comment_id: int, comment: schemas.CommentBase, Authorize: AuthJWT = Depends(), db: Session = Depends(get_db)):
+@sqlbudget.budget(5)
+async def comments_update(comment_id: int, comment: schemas.CommentBase, Authorize: AuthJWT = Depends(), db: AsyncSession = Depends(get_async_db)):
     Authorize.jwt_required()
-    comment_source = crud.get_comment(comment_id=comment_id, db=db)
+    comment_source = await aio.crud.get_comment(comment_id=comment_id, db=db)
     if comment_source['owner_id'] == Authorize.get_jwt_subject():
-        return crud.update_comment(db=db, comment=comment, comment_id=comment_id)
+        return await aio.crud.update_comment(db=db, comment=comment, comment_id=comment_id)
 
 @app.delete('/comments/{comment_id}', response_model=dict)
-async def comments_delete(comment_id: int, Authorize: AuthJWT = Depends(), db: Session = Depends(get_db)):
+@sqlbudget.budget(5)
+async def comments_delete(comment_id: int, Authorize: AuthJWT = Depends(), db: AsyncSession = Depends(get_async_db)):
     Authorize.jwt_required()
-    comment_source = crud.get_comment(comment_id=comment_id, db=db)
+    comment_source = await aio.crud.get_comment(comment_id=comment_id, db=db)
     if comment_source is None:
         raise HTTPException(status_code=404, detail="Comment not found")
     if comment_source['owner_id'] == Authorize.get_jwt_subject():
-        return crud.delete_comment(db=db, comment_id=comment_id)
+        return await aio.crud.delete_comment(db=db, comment_id=comment_id)
     else:
         raise HTTPException(status_code=401, detail="You're not owner of comment to remove")
 
 @app.post('/transfer', response_model=schemas.Transfer)
-async def transfer_add(comment: schemas.TransferCreate, Authorize: AuthJWT = Depends(), db: Session = Depends(get_db)):
+@sqlbudget.budget(3)
+async def transfer_add(comment: schemas.TransferCreate, Authorize: AuthJWT = Depends(), db: AsyncSession = Depends(get_async_db)):
     Authorize.jwt_required()
     user_id = Authorize.get_jwt_subject()
-    pet = crud.get_pet(db=db, pet_id=transfer.pet_id)
+    pet = await aio.crud.get_pet(db=db, pet_id=transfer.pet_id)
     if pet is not None:
         if not pet.has_home:
             transfer.owner_id = pet.owner_id
@@ -372,27 +457,43 @@ async def transfer_add(comment: schemas.TransferCreate, Authorize: AuthJWT = Dep
     else:
         raise HTTPException(status_code=404, detail="Pet not found")
         
-    return crud.create_transfer(db=db, transfer=transfer, user_id=user_id)
+    return await aio.crud.create_transfer(db=db, transfer=transfer, user_id=user_id)
 
 @app.put('/transfer/{transfer_id}', response_model=schemas.Transfer)
-async def transfer_update(transfer: schemas.TransferUpdate, transfer_id: int, Authorize: AuthJWT = Depends(), db: Session = Depends(get_db)):
+@sqlbudget.budget(3)
+async def transfer_update(transfer: schemas.TransferUpdate, transfer_id: int, Authorize: AuthJWT = Depends(), db: AsyncSession = Depends(get_async_db)):
     Authorize.jwt_required()
-    return crud.update_transfer(db=db, transfer=transfer, transfer_id=transfer_id)
+    return await aio.crud.update_transfer(db=db, transfer=transfer, transfer_id=transfer_id)
 
 @app.get('/search', response_model=List[schemas.Post])
-def perform_search(offset: int = 0, limit: int = 100, species: str | None = None, gte_date: date | None = None, sex: str | None = None, country: str | None = None, city: str | None = None, has_home: bool | None = None, Authorize: AuthJWT = Depends(), db: Session = Depends(get_db)):
+@sqlbudget.budget(1)
+def perform_search(response: Response, offset: int = 0, limit: int = 100, cursor: str | None = None, q: str | None = None, species: str | None = None, gte_date: date | None = None, sex: str | None = None, country: str | None = None, city: str | None = None, has_home: bool | None = None, near: str | None = Query(None, regex=r'^-?\d+(\.\d+)?,-?\d+(\.\d+)?$', description='latitude,longitude'), radius_km: float = Query(30, gt=0, le=1000), Authorize: AuthJWT = Depends(), db: Session = Depends(get_db)):
     Authorize.jwt_optional()
     user_id = Authorize.get_jwt_subject() or None
-    query = schemas.Search(species=species, gte_date=gte_date, sex=sex, country=country, city=city, has_home=has_home)
-    posts = search.get_posts(db=db, offset=offset, limit=limit, query=query, user_id=user_id)
-    if posts:
-        for p in range(len(posts)):
-            for i in range(len(posts[p]['images'])):
-                posts[p]['images'][i] = IMAGES_PUBLIC_URL + posts[p]['images'][i]
-            if 'avatar' in posts[p]:
-                posts[p]['avatar'] = IMAGES_PUBLIC_URL + posts[p]['avatar']
-    return posts
+    if near is not None:
+        near = tuple(float(part) for part in near.split(','))
+        if not (-90 <= near[0] <= 90 and -180 <= near[1] <= 180):
+            raise HTTPException(status_code=422, detail="near must be latitude,longitude")
+    query = schemas.Search(q=q, species=species, gte_date=gte_date, sex=sex, country=country, city=city, has_home=has_home, near=near, radius_km=radius_km)
+    posts = search.get_posts(db=db, offset=offset, limit=limit, query=query, user_id=user_id, cursor=cursor)
+    set_next_cursor(response, posts, limit, *(('rank', 'owner_id') if q else ('owner_id',)))
+    return responses.respond(posts, schemas.Post, response)
         
+@app.get('/metrics', include_in_schema=False)
+@sqlbudget.budget(0)
+def metrics_get():
+    return metrics.exposition()
+
+@app.get('/internal/pool', response_model=dict, include_in_schema=False)
+@sqlbudget.budget(0)
+def internal_pool():
+    return {'sync': database.pool_status(engine), 'async': database.pool_status(async_engine)}
+
+@app.get('/internal/cache', response_model=dict, include_in_schema=False)
+@sqlbudget.budget(0)
+def internal_cache():
+    return cache.entities.stats()
+
 def custom_openapi():
     if app.openapi_schema:
         return app.openapi_schema
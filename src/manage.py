@@ -0,0 +1,98 @@
+"""Maintenance commands, run from the repository root:
+
+    python src/manage.py repair-counters
+    python src/manage.py import users users.csv --ids user_ids.ndjson
+    python src/manage.py check-migrations
+    python src/manage.py rebuild-feeds
+"""
+import argparse
+import os
+import sys
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from database import SessionLocal, engine
+import crud, bulk, models, fanout
+
+ALEMBIC_INI = os.path.join(os.path.dirname(__file__), '..', 'alembic.ini')
+
+
+def repair_counters(args):
+    db = SessionLocal()
+    try:
+        fixed = crud.repair_counters(db)
+    finally:
+        db.close()
+    print(f'repaired counters of {fixed} posts')
+
+
+def rebuild_feeds(args):
+    db = SessionLocal()
+    try:
+        items = fanout.rebuild(db, args.user)
+    finally:
+        db.close()
+    print(f'rebuilt feeds with {items} items')
+
+
+def import_rows(args):
+    rejects = open(args.rejects, 'w') if args.rejects else sys.stderr
+    ids = open(args.ids, 'w') if args.ids else None
+    format = args.format or ('ndjson' if args.file.endswith(('.ndjson', '.jsonl')) else 'csv')
+    db = SessionLocal()
+    try:
+        with open(args.file, newline='') as file:
+            report = bulk.import_file(db, args.table, file, format, bulk.Report(rejects, ids), args.batch_size)
+    finally:
+        db.close()
+        if args.rejects:
+            rejects.close()
+        if ids is not None:
+            ids.close()
+    print(f'imported {report.imported} {args.table}, rejected {report.rejected} ({report.rows_per_second:.0f} rows/s)')
+
+
+def check_migrations(args):
+    """Fails when the database is not at the latest revision or differs from models.py."""
+    head = ScriptDirectory.from_config(Config(ALEMBIC_INI)).get_current_head()
+    with engine.connect() as conn:
+        context = MigrationContext.configure(conn)
+        current = context.get_current_revision()
+        diff = compare_metadata(context, models.Base.metadata)
+    if current != head:
+        sys.exit(f'database is at revision {current}, migrations end at {head}: run alembic upgrade head first')
+    if diff:
+        for change in diff:
+            print(change, file=sys.stderr)
+        sys.exit(f'models.py and the migrations differ in {len(diff)} places: add a migration')
+    print(f'models.py matches the migrations at {head}')
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='manage.py')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('repair-counters', help='recompute likes_count/comments_count where they drifted').set_defaults(func=repair_counters)
+
+    rebuilder = commands.add_parser('rebuild-feeds', help='recompute the materialized home feeds')
+    rebuilder.add_argument('--user', type=int, help='only the feed of this user id')
+    rebuilder.set_defaults(func=rebuild_feeds)
+
+    commands.add_parser('check-migrations', help='fail if models.py and the migrations have drifted apart').set_defaults(func=check_migrations)
+
+    importer = commands.add_parser('import', help='bulk load a CSV or NDJSON file')
+    importer.add_argument('table', choices=list(bulk.TABLES))
+    importer.add_argument('file')
+    importer.add_argument('--format', choices=['csv', 'ndjson'], help='by default guessed from the file extension')
+    importer.add_argument('--rejects', help='write rejected rows here instead of stderr')
+    importer.add_argument('--ids', help='write the id of every imported row here')
+    importer.add_argument('--batch-size', type=int, default=bulk.BATCH_SIZE)
+    importer.set_defaults(func=import_rows)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""Prometheus metrics served at /metrics.
+
+Latency, response size and SQL statement histograms are labelled with the
+route template (/posts/{post_id}), never the raw path. SQL statements are
+counted through engine events into a per-request context, so a request's
+statements are attributed to it whether it ran on the sync or async engine.
+
+With several workers set PROMETHEUS_MULTIPROC_DIR so /metrics aggregates all
+of them.
+"""
+import os
+import time
+from contextvars import ContextVar
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest, CONTENT_TYPE_LATEST, multiprocess
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+from starlette.responses import Response
+from starlette.types import ASGIApp, Receive, Scope, Send
+import database
+
+LATENCY_BUCKETS = (.005, .01, .025, .05, .075, .1, .25, .5, .75, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+REQUEST_DURATION = Histogram('http_request_duration_seconds', 'Request latency', ['method', 'route', 'status'], buckets=LATENCY_BUCKETS)
+RESPONSE_SIZE = Histogram('http_response_size_bytes', 'Response body size', ['method', 'route'], buckets=SIZE_BUCKETS)
+IN_FLIGHT = Gauge('http_requests_in_flight', 'Requests being handled', ['method'], multiprocess_mode='livesum')
+REQUEST_STATEMENTS = Histogram('db_statements_per_request', 'SQL statements issued by one request', ['method', 'route'], buckets=STATEMENT_BUCKETS)
+REQUEST_DB_TIME = Histogram('db_time_per_request_seconds', 'Time spent in SQL statements by one request', ['method', 'route'], buckets=LATENCY_BUCKETS)
+STATEMENTS = Counter('db_statements_total', 'SQL statements executed', ['engine'])
+
+UNMATCHED = '<unmatched>'
+
+
+class QueryStats:
+    __slots__ = ('statements', 'seconds')
+
+    def __init__(self):
+        self.statements = 0
+        self.seconds = 0.0
+
+
+current_queries: ContextVar = ContextVar('current_queries', default=None)
+
+
+def instrument(engine, name: str):
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        STATEMENTS.labels(name).inc()
+        stats = current_queries.get()
+        if stats is not None:
+            stats.statements += 1
+            stats.seconds += elapsed
+
+
+instrument(database.engine, 'sync')
+instrument(database.async_engine.sync_engine, 'async')
+
+
+def route_template(scope: Scope) -> str:
+    route = scope.get('route')
+    return getattr(route, 'path', UNMATCHED)
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        method = scope['method']
+        status = 500
+        size = 0
+        queries = QueryStats()
+        token = current_queries.set(queries)
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            elif message['type'] == 'http.response.body':
+                size += len(message.get('body', b''))
+            await send(message)
+
+        IN_FLIGHT.labels(method).inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            IN_FLIGHT.labels(method).dec()
+            current_queries.reset(token)
+            route = route_template(scope)
+            REQUEST_DURATION.labels(method, route, str(status)).observe(elapsed)
+            RESPONSE_SIZE.labels(method, route).observe(size)
+            REQUEST_STATEMENTS.labels(method, route).observe(queries.statements)
+            REQUEST_DB_TIME.labels(method, route).observe(queries.seconds)
+
+
+class PoolCollector:
+    """Connection pool gauges of this worker, read at scrape time."""
+
+    KEYS = ('size', 'checked_in', 'checked_out', 'overflow', 'checkouts', 'timeouts', 'wait_seconds_total', 'wait_seconds_max')
+
+    def collect(self):
+        pid = str(os.getpid())
+        statuses = {'sync': database.pool_status(database.engine), 'async': database.pool_status(database.async_engine)}
+        for key in self.KEYS:
+            gauge = GaugeMetricFamily(f'db_pool_{key}', f'Connection pool {key}', labels=['engine', 'pid'])
+            for name, status in statuses.items():
+                gauge.add_metric([name, pid], status[key])
+            yield gauge
+
+
+def registry():
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        collected = CollectorRegistry()
+        multiprocess.MultiProcessCollector(collected)
+        # pool gauges are not shared between processes, these are the scraped worker's
+        collected.register(PoolCollector())
+        return collected
+    return REGISTRY
+
+
+if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+    REGISTRY.register(PoolCollector())
+
+
+def exposition():
+    return Response(generate_latest(registry()), media_type=CONTENT_TYPE_LATEST)
@@ -1,4 +1,6 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, ARRAY, Date, DateTime, Index
+from functools import lru_cache
+from operator import attrgetter
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, ARRAY, Date, DateTime, Index, Computed, Float, func
 from sqlalchemy import UniqueConstraint
 # from sqlalchemy.types import Date
 from sqlalchemy.orm import relationship
@@ -6,9 +8,20 @@ from datetime import datetime
 from sqlalchemy.ext.declarative import declared_attr, declarative_base
 from sqlalchemy import Table
 from typing import Dict, Any
-from sqlalchemy.dialects.postgresql import ENUM
+from sqlalchemy.dialects.postgresql import ENUM, JSONB, TSVECTOR
 import schemas
 
+@lru_cache(maxsize=None)
+def columns(model):
+    """Columns the app reads; generated ones like search vectors stay in the database."""
+    return tuple(c for c in model.__table__.columns if c.computed is None)
+
+@lru_cache(maxsize=None)
+def column_reader(model):
+    """Column names of model and one attrgetter reading all of them, built once per model."""
+    names = tuple(c.name for c in columns(model))
+    return names, attrgetter(*names)
+
 class Custom:
     """Some custom logic here!"""
 
@@ -20,10 +33,35 @@ class Custom:
 
     def to_dict(self) -> Dict[str, Any]:
         """Serializes only column data."""
-        return {c.name: getattr(self, c.name) for c in self.__table__.columns}
+        names, read = column_reader(type(self))
+        return dict(zip(names, read(self)))
 
 Base = declarative_base(cls=Custom)
 
+SEARCH_CONFIG = 'english'
+PET_SEARCH_VECTOR = (
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(name, '') || ' ' || coalesce(species, '')), 'A') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'B')"
+)
+POST_SEARCH_VECTOR = f"to_tsvector('{SEARCH_CONFIG}', coalesce(text, ''))"
+
+
+class Location(Base):
+    __tablename__ = "locations"
+    __table_args__ = (
+        # bounding box prefilter of radius search
+        Index("ix_locations_latitude_longitude", "latitude", "longitude"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    country = Column(String)
+    state = Column(String)
+    city = Column(String)
+    latitude = Column(Float)
+    longitude = Column(Float)
+
+# one row per place, a missing part counts as empty
+Index("ix_locations_place", func.coalesce(Location.country, ''), func.coalesce(Location.state, ''), func.coalesce(Location.city, ''), unique=True)
 
 class User(Base):
     __tablename__ = "users"
@@ -33,14 +71,21 @@ class User(Base):
     username = Column(String, unique=True, index=True)
     hashed_password = Column(String)
     phone = Column(String)
-    country = Column(String)
-    state = Column(String)
-    city = Column(String)
+    location_id = Column(Integer, ForeignKey("locations.id"), index=True)
     address = Column(String)
+    # bumped by invalidation.invalidate, the ETag of the user
+    version = Column(Integer, nullable=False, default=1, server_default='1')
     pets = relationship("Pet", back_populates="owner")
 
 class Pet(Base):
     __tablename__ = "pets"
+    __table_args__ = (
+        # search filters: species/sex/birth_date and has_home/species
+        Index("ix_pets_species_sex_birth_date", "species", "sex", "birth_date"),
+        Index("ix_pets_has_home_species", "has_home", "species"),
+        Index("ix_pets_search_vector", "search_vector", postgresql_using="gin"),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
     description = Column(String)
@@ -48,24 +93,45 @@ class Pet(Base):
     species = Column(String, index=True)
     birth_date = Column(Date, index=True) 
     image = Column(String)
+    image_variants = Column(JSONB)
     has_home = Column(Boolean, server_default='t', default=True)
-    owner_id = Column(Integer, ForeignKey("users.id"))    
+    owner_id = Column(Integer, ForeignKey("users.id"), index=True)
+    # too many interested users to copy its posts into their feeds, see fanout.py
+    feed_on_read = Column(Boolean, nullable=False, default=False, server_default='f')
+    version = Column(Integer, nullable=False, default=1, server_default='1')
+    # name and species weigh more than words in the description
+    search_vector = Column(TSVECTOR, Computed(PET_SEARCH_VECTOR, persisted=True))
     owner = relationship("User", back_populates="pets")
     posts = relationship("Post", backref="pets", cascade="all, delete")
 
 class Post(Base):
     __tablename__ = "posts"
+    __table_args__ = (
+        Index("ix_posts_time_id", "time", "id"),
+        Index("ix_posts_owner_id_time_id", "owner_id", "time", "id"),
+        Index("ix_posts_search_vector", "search_vector", postgresql_using="gin"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    text = Column(String, index=True)
+    text = Column(String)
     owner_id = Column(Integer, ForeignKey("pets.id"))
     images = Column(ARRAY(String()))
+    image_variants = Column(JSONB)
     time = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    likes_count = Column(Integer, nullable=False, default=0, server_default='0')
+    comments_count = Column(Integer, nullable=False, default=0, server_default='0')
+    # time stays put when counters, comments or variants change, this does not
+    version = Column(Integer, nullable=False, default=1, server_default='1')
+    search_vector = Column(TSVECTOR, Computed(POST_SEARCH_VECTOR, persisted=True))
     comments = relationship("Comment", back_populates="post", cascade="all, delete")
     likes = relationship("Like", backref="posts", cascade="all, delete")
 
 class Comment(Base):
     __tablename__ = "comments"
+    __table_args__ = (
+        Index("ix_comments_time_id", "time", "id"),
+        Index("ix_comments_post_id_time_id", "post_id", "time", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     text = Column(String, index=True)
@@ -78,12 +144,25 @@ class Like(Base):
     __tablename__ = "likes"
     __table_args__ = (
         UniqueConstraint("post_id", "owner_id", name="post_owner_key"),
+        # posts liked by a user
+        Index("ix_likes_owner_id_post_id", "owner_id", "post_id"),
     )
 
     id = Column(Integer, primary_key=True, index=True)
     post_id = Column(Integer, ForeignKey("posts.id"))
     owner_id = Column(Integer, ForeignKey("users.id"))
 
+class FeedItem(Base):
+    __tablename__ = "feed_items"
+    __table_args__ = (
+        # a home feed, newest first
+        Index("ix_feed_items_user_id_time_post_id", "user_id", "time", "post_id"),
+    )
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    post_id = Column(Integer, ForeignKey("posts.id"), primary_key=True, index=True)
+    time = Column(DateTime, nullable=False)
+
 class Transfer(Base):
     __tablename__ = "transfers"
     # __table_args__ = (
@@ -116,3 +195,8 @@ class Shelter(Base):
     user_id = Column(Integer, ForeignKey("users.id"), unique=True)
     pet_id = Column(Integer, ForeignKey("pets.id"))
 
+class Blob(Base):
+    __tablename__ = "blobs"
+
+    path = Column(String, primary_key=True)
+    refcount = Column(Integer, nullable=False, default=0)
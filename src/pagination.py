@@ -0,0 +1,58 @@
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import tuple_
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(*values) -> str:
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_value(value, column):
+    """value of a cursor as the python type of column, InvalidCursor if it is not one."""
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return value
+    if python_type is datetime:
+        if not isinstance(value, str):
+            raise InvalidCursor(value)
+        return datetime.fromisoformat(value)
+    # JSON has no separate bool, and writes whole floats as ints
+    accepted = (int, float) if python_type is float else python_type
+    if isinstance(value, bool) or not isinstance(value, accepted):
+        raise InvalidCursor(value)
+    return value
+
+
+def decode_cursor(cursor: str, columns) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise InvalidCursor(cursor)
+        return [decode_value(v, column) for v, column in zip(values, columns)]
+    except (ValueError, TypeError) as err:
+        raise InvalidCursor(cursor) from err
+
+
+def keyset(query, columns, cursor: str = None, descending: bool = True):
+    """Orders query by columns and continues after the row the cursor points at."""
+    if cursor:
+        values = decode_cursor(cursor, columns)
+        if descending:
+            query = query.filter(tuple_(*columns) < tuple_(*values))
+        else:
+            query = query.filter(tuple_(*columns) > tuple_(*values))
+    return query.order_by(*[c.desc() if descending else c.asc() for c in columns])
+
+
+def next_cursor(items: list, limit: int, *keys):
+    """Cursor for the page after items, or None when items is the last page."""
+    if not items or len(items) < limit:
+        return None
+    return encode_cursor(*[items[-1][key] for key in keys])
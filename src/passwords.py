@@ -0,0 +1,65 @@
+"""Password hashing.
+
+Passwords are hashed with argon2id. argon2-cffi releases the GIL while it
+works, so the async helpers run it on a small thread pool of its own: a
+burst of logins queues there instead of stalling the event loop or taking
+the threads that serve the sync routes. The cost is set with
+PASSWORD_TIME_COST, PASSWORD_MEMORY_COST (KiB) and PASSWORD_PARALLELISM, the
+pool size with PASSWORD_WORKERS. Legacy "notreallyhashed" passwords and
+hashes made with other parameters still verify and are replaced on the next
+successful login.
+"""
+import asyncio
+import hmac
+import os
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHash, VerificationError
+
+TIME_COST = int(os.environ.get('PASSWORD_TIME_COST', 3))
+MEMORY_COST = int(os.environ.get('PASSWORD_MEMORY_COST', 65536))
+PARALLELISM = int(os.environ.get('PASSWORD_PARALLELISM', 1))
+WORKERS = int(os.environ.get('PASSWORD_WORKERS', os.cpu_count() or 1))
+
+LEGACY_SUFFIX = 'notreallyhashed'
+
+hasher = PasswordHasher(time_cost=TIME_COST, memory_cost=MEMORY_COST, parallelism=PARALLELISM)
+executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='passwords')
+# verified in place of a missing hash, so unknown usernames cost as much as wrong passwords
+DUMMY_HASH = hasher.hash(secrets.token_hex(16))
+
+
+def is_legacy(hashed: str) -> bool:
+    return not hashed.startswith('$argon2')
+
+
+def hash(password: str) -> str:
+    return hasher.hash(password)
+
+
+def verify(hashed: str | None, password: str) -> bool:
+    if not hashed:
+        try:
+            hasher.verify(DUMMY_HASH, password)
+        except VerificationError:
+            pass
+        return False
+    if is_legacy(hashed):
+        return hmac.compare_digest(hashed.encode(), (password + LEGACY_SUFFIX).encode())
+    try:
+        return hasher.verify(hashed, password)
+    except (VerificationError, InvalidHash):
+        return False
+
+
+def needs_rehash(hashed: str) -> bool:
+    return is_legacy(hashed) or hasher.check_needs_rehash(hashed)
+
+
+async def hash_async(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(executor, hash, password)
+
+
+async def verify_async(hashed: str | None, password: str) -> bool:
+    return await asyncio.get_running_loop().run_in_executor(executor, verify, hashed, password)
@@ -0,0 +1,78 @@
+"""JSON responses for the data the handlers build themselves.
+
+Handlers get plain dicts from crud and search. respond() walks them once: it
+keeps only the fields of the endpoint's schema, fills in their defaults,
+turns stored image paths into public URLs, and encodes the result with
+orjson. FastAPI sends a returned Response as it is, so these dicts are not
+validated a second time; response_model stays on the routes for the
+OpenAPI schema.
+"""
+from functools import lru_cache
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+from starlette.responses import Response
+
+IMAGES_PUBLIC_URL = 'https://api2.adoptpets.click'
+
+
+def public_url(path):
+    if path is None:
+        return None
+    return IMAGES_PUBLIC_URL + path
+
+
+def public_urls(paths):
+    if paths is None:
+        return None
+    return [IMAGES_PUBLIC_URL + path for path in paths]
+
+
+def public_variants(variants):
+    if variants is None:
+        return None
+    if isinstance(variants, list):
+        return [public_variants(v) for v in variants]
+    return {name: {ext: IMAGES_PUBLIC_URL + path for ext, path in formats.items()} for name, formats in variants.items()}
+
+
+# fields holding paths under static/, by name in any schema
+REWRITES = {
+    'image': public_url,
+    'avatar': public_url,
+    'images': public_urls,
+    'image_variants': public_variants,
+}
+
+
+@lru_cache(maxsize=None)
+def plan(model: type[BaseModel]) -> tuple:
+    """(name, default, convert) of every field of model, built once per schema."""
+    fields = []
+    for name, field in model.__fields__.items():
+        convert = REWRITES.get(name)
+        if isinstance(field.type_, type) and issubclass(field.type_, BaseModel):
+            convert = lambda value, nested=field.type_: project(value, nested)
+        fields.append((name, field.default, convert))
+    return tuple(fields)
+
+
+def project(data, model: type[BaseModel]):
+    """data (a dict, object or list of them) reduced to model's fields, with public image URLs."""
+    if data is None:
+        return None
+    if isinstance(data, list):
+        return [project(item, model) for item in data]
+    get = data.get if isinstance(data, dict) else lambda name, default: getattr(data, name, default)
+    projected = {}
+    for name, default, convert in plan(model):
+        value = get(name, default)
+        projected[name] = convert(value) if convert is not None and value is not None else value
+    return projected
+
+
+def respond(data, model: type[BaseModel], response: Response | None = None) -> ORJSONResponse:
+    """data as the JSON of model, keeping the headers a handler set on its injected response."""
+    out = ORJSONResponse(project(data, model))
+    if response is not None:
+        out.raw_headers.extend((key, value) for key, value in response.raw_headers if key not in (b'content-length', b'content-type'))
+    return out
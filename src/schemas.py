@@ -34,6 +34,7 @@ class Pet(PetBase):
     species: str
     birth_date: date
     image: str | None = None
+    image_variants: dict[str, dict[str, str]] | None = None
     has_home: bool
     owner_id: int
     country: str | None = None
@@ -114,6 +115,7 @@ class Post(PostBase):
     id: int
     text: Optional[str]
     images: List[str] | None = None
+    image_variants: List[dict[str, dict[str, str]]] | None = None
     time: datetime
     owner_id: int
     avatar: Optional[str]
@@ -146,6 +148,11 @@ class Like(LikeBase):
     class Config:
         orm_mode = True
 
+class PostLikes(BaseModel):
+    id: int
+    likes_count: int
+    liked: bool = False
+
 class TransferBase(BaseModel):
     pass
 
@@ -187,9 +194,38 @@ class Shelter(BaseModel):
 
 
 class Search(BaseModel):
+    q: Optional[str]
     species: Optional[str]
     gte_date: Optional[date] | None = None
     sex: Optional[str]
     country: Optional[str]
     city: Optional[str]
     has_home: Optional[bool]
+    # (latitude, longitude)
+    near: tuple[float, float] | None = None
+    radius_km: float = 30
+
+
+class LocationImport(BaseModel):
+    country: str
+    state: Optional[str]
+    city: Optional[str]
+    latitude: float
+    longitude: float
+
+class UserImport(UserCreate):
+    country: Optional[str]
+    state: Optional[str]
+    city: Optional[str]
+    address: Optional[str]
+    phone: Optional[str]
+
+class PetImport(PetCreate):
+    owner_id: int
+
+class PostImport(PostCreate):
+    owner_id: int
+    time: datetime | None = None
+
+class CommentImport(CommentCreate):
+    time: datetime | None = None
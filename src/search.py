@@ -1,52 +1,66 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from sqlalchemy.inspection import inspect
-from sqlalchemy import exc
-import models, schemas
-from database import SessionLocal, engine
-from sqlalchemy.orm import joinedload
-from sqlalchemy.inspection import inspect
-
-def get_posts(db: Session, offset: int, limit: int, query: schemas.Search, user_id: int = None):
-    search = db.query(models.Post,models.Pet,models.User).filter(models.Pet.id == models.Post.owner_id, models.User.id == models.Pet.owner_id).distinct(models.Pet.id).order_by(models.Pet.id.desc(),models.Post.time.desc())
-
-    if query.species is not None and query.species is not "":
+from sqlalchemy import select, true, func, cast, Float
+from sqlalchemy.dialects.postgresql import DOUBLE_PRECISION
+import models, schemas, feed, pagination, locations
+
+
+def filter_pets(search, query: schemas.Search):
+    if query.species:
         search = search.filter(models.Pet.species == query.species)
 
-    if query.sex is not None and len(query.sex) > 0:
+    if query.sex:
         search = search.filter(models.Pet.sex == query.sex)
 
-    if query.gte_date is not None and query.gte_date:
+    if query.gte_date is not None:
         search = search.filter(models.Pet.birth_date >= query.gte_date)
 
-    if query.country is not None and len(query.country) > 0:
-        search = search.filter(models.User.country == query.country)
+    if query.country:
+        search = search.filter(models.Location.country == locations.normalize(query.country))
 
-    if query.city is not None and len(query.city) > 0:
-        search = search.filter(models.User.city == query.city)
+    if query.city:
+        search = search.filter(models.Location.city == locations.normalize(query.city))
 
-    if query.has_home is not None and len(query.has_home) > 0:
+    if query.near is not None:
+        latitude, longitude = query.near
+        search = search.filter(models.User.location_id.in_(locations.near(latitude, longitude, query.radius_km)))
+
+    if query.has_home is not None:
         search = search.filter(models.Pet.has_home == query.has_home)
 
-    result = search.offset(offset).limit(limit).all()
+    return search
+
+
+def get_posts(db: Session, offset: int, limit: int, query: schemas.Search, user_id: int = None, cursor: str = None):
+    latest = select(*models.columns(models.Post)).where(models.Post.owner_id == models.Pet.id)
+    if query.q:
+        tsquery = func.websearch_to_tsquery(models.SEARCH_CONFIG, query.q)
+        # the pet's latest matching post if it has one, through the pet's few posts
+        latest = latest.add_columns(func.ts_rank(models.Post.search_vector, tsquery, type_=Float).label('post_rank')).order_by(models.Post.search_vector.op('@@')(tsquery).desc())
+    # latest post of every matching pet, picked per pet through posts(owner_id, time, id)
+    latest = latest.order_by(models.Post.time.desc()).limit(1).lateral('latest_post')
+    post_columns = [c for c in latest.c if c.name != 'post_rank']
+
+    search = db.query(*post_columns, models.Pet.name.label('name'), models.Pet.image.label('avatar'), *locations.columns(), *feed.post_stats(user_id, latest.c)).select_from(models.Pet).join(models.User, models.User.id == models.Pet.owner_id).outerjoin(models.Location, models.Location.id == models.User.location_id).join(latest, true())
+    search = filter_pets(search, query)
+
+    if query.q:
+        # pets whose own words or any of whose posts match, both through the GIN indexes
+        search = search.filter(models.Pet.id.in_(
+            select(models.Pet.id).where(models.Pet.search_vector.op('@@')(tsquery)).correlate(None)
+            .union(select(models.Post.owner_id).where(models.Post.search_vector.op('@@')(tsquery)))
+        ))
+        # double precision so the rank survives the round trip through the cursor exactly
+        rank = cast(func.ts_rank(models.Pet.search_vector, tsquery, type_=Float) + func.coalesce(latest.c.post_rank, 0), DOUBLE_PRECISION)
+        search = search.add_columns(rank.label('rank'))
+        order = (rank, models.Pet.id)
+    else:
+        order = (models.Pet.id,)
+
+    result = pagination.keyset(search, order, cursor).offset(offset).limit(limit).all()
 
     posts = []
     for item in result:
-        post = {}
-        post['text'] = item[0].text
-        post['images'] = item[0].images
-        post['id'] = item[0].id
-        post['time'] = item[0].time
-        post['owner_id'] = item[0].owner_id
-        post['avatar'] = item[1].image 
-        post['name'] = item[1].name
-        post['country'] = item[2].country
-        post['city'] = item[2].city
-        post['comments_count'] = len(item[0].comments)
-        post['likes_count'] = db.query(models.Like).filter(models.Like.post_id == post['id']).count()
-        if user_id is not None:
-            post['liked'] = bool(db.query(models.Like).filter(models.Like.post_id == post['id'], models.Like.owner_id == user_id).count())
-        else:
-            post['liked'] = False
-        posts.append(post)
+        post_dict = item._asdict()
+        post_dict['liked'] = bool(post_dict['liked'])
+        posts.append(post_dict)
     return posts
@@ -0,0 +1,132 @@
+"""SQL statement budgets per endpoint and N+1 detection.
+
+Every route in main.py declares how many statements it may issue:
+
+    @app.get('/posts/{post_id}')
+    @sqlbudget.budget(2)
+    def posts_get(...):
+
+With SQL_BUDGET=raise (tests) or SQL_BUDGET=warn (staging) the middleware
+records all statements of a request, groups them by shape and fails the
+request, or logs it, when the route went over its budget or repeated one
+statement shape N_PLUS_ONE times, the usual sign of a lazy load in a loop.
+record() gives the same recording to tests and scripts outside a request.
+"""
+import logging
+import os
+import re
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+import database
+
+MODE = os.environ.get('SQL_BUDGET', 'off')
+N_PLUS_ONE = int(os.environ.get('SQL_BUDGET_N_PLUS_ONE', 3))
+
+logger = logging.getLogger(__name__)
+
+current_recording: ContextVar = ContextVar('current_recording', default=None)
+
+PARAMS = re.compile(r'(%\(\w+\)s|\$\d+|:\w+|\?)(\s*,\s*(%\(\w+\)s|\$\d+|:\w+|\?))*')
+WHITESPACE = re.compile(r'\s+')
+
+
+class BudgetExceeded(AssertionError):
+    pass
+
+
+def budget(statements: int):
+    """Declares the most statements the decorated endpoint may issue."""
+    def mark(endpoint):
+        endpoint.sql_budget = statements
+        return endpoint
+    return mark
+
+
+def shape(statement: str) -> str:
+    """Statement text with bound parameter lists collapsed, so IN (...) of any size matches."""
+    return PARAMS.sub('?', WHITESPACE.sub(' ', statement).strip())
+
+
+class Recording:
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def repeated(self, threshold: int = N_PLUS_ONE):
+        """Statement shapes issued at least threshold times."""
+        return {s: n for s, n in Counter(shape(s) for s in self.statements).items() if n >= threshold}
+
+    def check(self, limit, name: str = 'block'):
+        problems = []
+        if limit is not None and self.count > limit:
+            problems.append(f'{name} issued {self.count} SQL statements, its budget is {limit}')
+        for statement, times in self.repeated().items():
+            problems.append(f'{name} repeated a statement {times} times (N+1?): {statement}')
+        if problems:
+            raise BudgetExceeded('\n'.join(problems))
+
+
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    recording = current_recording.get()
+    if recording is not None:
+        recording.statements.append(statement)
+
+
+for _engine in (database.engine, database.async_engine.sync_engine):
+    event.listen(_engine, 'before_cursor_execute', _record_statement)
+
+
+@contextmanager
+def record():
+    recording = Recording()
+    token = current_recording.set(recording)
+    try:
+        yield recording
+    finally:
+        current_recording.reset(token)
+
+
+class SQLBudgetMiddleware:
+    def __init__(self, app: ASGIApp, mode: str = MODE):
+        self.app = app
+        self.mode = mode
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http' or self.mode == 'off':
+            return await self.app(scope, receive, send)
+
+        # in raise mode the response is held back until the check passed
+        held = []
+
+        async def hold(message):
+            held.append(message)
+
+        with record() as recording:
+            await self.app(scope, receive, hold if self.mode == 'raise' else send)
+
+        try:
+            self.check(scope, recording)
+        except BudgetExceeded as err:
+            if self.mode == 'raise':
+                logger.error('SQL budget exceeded', exc_info=True)
+                return await JSONResponse({'detail': str(err)}, status_code=500)(scope, receive, send)
+            logger.warning('SQL budget exceeded', exc_info=True)
+        for message in held:
+            await send(message)
+
+    def check(self, scope: Scope, recording: Recording):
+        route = scope.get('route')
+        if route is None:
+            return
+        name = f"{scope['method']} {route.path}"
+        limit = getattr(route.endpoint, 'sql_budget', None)
+        if limit is None:
+            raise BudgetExceeded(f'{name} has no SQL budget')
+        recording.check(limit, name)
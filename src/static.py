@@ -0,0 +1,90 @@
+"""Static image serving for upload directories.
+
+Uploaded files never change under their name, so responses are cacheable
+forever. Adds strong ETags, 304 answers to If-None-Match and single byte
+ranges on top of StaticFiles; whole files still go through FileResponse,
+which sends them zero-copy when the server supports it. In production Caddy
+serves /static itself, this covers setups without it.
+"""
+import mimetypes
+import os
+import re
+import stat
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Receive, Scope, Send
+
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+CONTENT_HASH = re.compile(r'^[0-9a-f]{64}$')
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 256 * 1024
+
+
+def etag(path: str, stat_result: os.stat_result) -> str:
+    name, _ = os.path.splitext(os.path.basename(path))
+    if CONTENT_HASH.match(name):
+        return f'"{name}"'
+    return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+
+def byte_range(header: str, size: int):
+    """(start, end) of a single 'bytes=' range, None to send the whole file."""
+    match = RANGE.match(header.strip())
+    if match is None:
+        return None
+    start, end = match.groups()
+    if start == '' and end == '':
+        return None
+    if start == '':
+        start, end = max(0, size - int(end)), size - 1
+    else:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+    return start, end
+
+
+class FileRangeResponse(Response):
+    def __init__(self, path: str, start: int, end: int, size: int, headers: dict):
+        super().__init__(status_code=206, headers=headers, media_type=mimetypes.guess_type(path)[0])
+        self.path = path
+        self.start = start
+        self.end = end
+        self.headers['content-range'] = f'bytes {start}-{end}/{size}'
+        self.headers['content-length'] = str(end - start + 1)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        await send({'type': 'http.response.start', 'status': self.status_code, 'headers': self.raw_headers})
+        async with await anyio.open_file(self.path, 'rb') as f:
+            await f.seek(self.start)
+            left = self.end - self.start + 1
+            while left > 0:
+                chunk = await f.read(min(CHUNK_SIZE, left))
+                if not chunk:
+                    break
+                left -= len(chunk)
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': left > 0})
+        if left > 0:
+            await send({'type': 'http.response.body', 'body': b''})
+
+
+class ImmutableStaticFiles(StaticFiles):
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        tag = etag(str(full_path), stat_result)
+        headers = {'cache-control': CACHE_CONTROL, 'etag': tag, 'accept-ranges': 'bytes'}
+
+        if tag in [t.strip() for t in request_headers.get('if-none-match', '').split(',')]:
+            return Response(status_code=304, headers=headers)
+
+        size = stat_result.st_size
+        if status_code == 200 and 'range' in request_headers and stat.S_ISREG(stat_result.st_mode):
+            if request_headers.get('if-range', tag) == tag:
+                requested = byte_range(request_headers['range'], size)
+                if requested is not None:
+                    start, end = requested
+                    if start >= size or start > end:
+                        return Response(status_code=416, headers={'content-range': f'bytes */{size}'})
+                    return FileRangeResponse(str(full_path), start, end, size, headers)
+
+        return FileResponse(full_path, status_code=status_code, stat_result=stat_result, headers=headers)
@@ -0,0 +1,133 @@
+"""Content-addressed image storage.
+
+Images are stored once per content under their sha256, sharded by its first
+bytes, e.g. static/post_images/ab/cd/abcd...ef.jpg. The blobs table counts
+the references to each file. Uploading the same photo again only adds a
+reference; when delete_pet/delete_post drop the last one, the file and its
+variants are removed after the commit. An advisory lock per path keeps a
+concurrent upload and collection of the same blob apart.
+
+add_all and release write in the caller's transaction. Files are removed
+by a background thread after it ends: unreferenced blobs after a commit,
+files moved in by add_all that no row references after a rollback.
+"""
+import glob
+import logging
+import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import event, func, select, bindparam, String
+from sqlalchemy.dialects.postgresql import insert, ARRAY
+from sqlalchemy.orm import Session
+import models
+from database import engine
+
+
+logger = logging.getLogger(__name__)
+
+# one thread, so removals never race each other
+collector = ThreadPoolExecutor(max_workers=1, thread_name_prefix='blob-collector')
+
+
+def blob_path(directory: str, digest: str, ext: str) -> str:
+    return f'{directory}{digest[:2]}/{digest[2:4]}/{digest}{ext}'
+
+
+def lock(db, paths: list):
+    """Takes the advisory locks of all paths in one statement, in a fixed order."""
+    path = func.unnest(bindparam('paths', sorted(set(paths)), type_=ARRAY(String))).table_valued('path')
+    db.execute(select(func.pg_advisory_xact_lock(func.hashtext(path.c.path))).select_from(path))
+
+
+def add_all(db: Session, directory: str, uploads: list) -> list:
+    """Moves uploaded (path, digest) pairs to their blob paths, returns the public paths.
+
+    The references count from the commit of the current transaction.
+    """
+    if not uploads:
+        return []
+    paths = []
+    try:
+        for upload, digest in uploads:
+            _, ext = os.path.splitext(upload)
+            paths.append('/' + blob_path(directory, digest, ext))
+        lock(db, paths)
+        references = Counter(paths)
+        upsert = insert(models.Blob).values([{'path': path, 'refcount': count} for path, count in references.items()])
+        db.execute(upsert.on_conflict_do_update(index_elements=[models.Blob.path], set_={'refcount': models.Blob.refcount + upsert.excluded.refcount}))
+        for (upload, _), public in zip(uploads, paths):
+            path = public.lstrip('/')
+            if os.path.exists(path):
+                os.remove(upload)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(upload, path)
+                db.info.setdefault('added', []).append(public)
+    except BaseException:
+        db.rollback()
+        for upload, _ in uploads:
+            if os.path.exists(upload):
+                os.remove(upload)
+        raise
+    return paths
+
+
+def release(db: Session, paths: list):
+    """Drops one reference to each path in the current transaction."""
+    references = Counter(path for path in paths if path)
+    if not references:
+        return
+    # one UPDATE per distinct number of references, usually just one
+    by_count = {}
+    for path, count in references.items():
+        by_count.setdefault(count, []).append(path)
+    for count, released in by_count.items():
+        db.query(models.Blob).filter(models.Blob.path.in_(released)).update({models.Blob.refcount: models.Blob.refcount - count}, synchronize_session=False)
+    db.info.setdefault('released', []).extend(references)
+
+
+def collect(paths: list):
+    """Removes the blobs among paths that are no longer referenced."""
+    with engine.begin() as conn:
+        lock(conn, paths)
+        unreferenced = conn.execute(models.Blob.__table__.delete().where(models.Blob.path.in_(paths), models.Blob.refcount <= 0).returning(models.Blob.path)).scalars().all()
+        for path in unreferenced:
+            base, _ = os.path.splitext(path.lstrip('/'))
+            for file in [path.lstrip('/')] + glob.glob(glob.escape(base) + '_*'):
+                if os.path.exists(file):
+                    os.remove(file)
+
+
+def discard(paths: list):
+    """Removes the files among paths that no blob references, left by a rolled back add_all."""
+    with engine.begin() as conn:
+        lock(conn, paths)
+        referenced = set(conn.execute(select(models.Blob.path).where(models.Blob.path.in_(paths))).scalars())
+        for path in set(paths) - referenced:
+            if os.path.exists(path.lstrip('/')):
+                os.remove(path.lstrip('/'))
+
+
+def _in_background(fn, paths: list):
+    def run():
+        try:
+            fn(paths)
+        except Exception:
+            logger.exception('removing blobs failed: %s', paths)
+    collector.submit(run)
+
+
+@event.listens_for(Session, 'after_commit')
+def _collect_released(session):
+    session.info.pop('added', None)
+    paths = session.info.pop('released', None)
+    if paths:
+        _in_background(collect, paths)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_released(session):
+    session.info.pop('released', None)
+    paths = session.info.pop('added', None)
+    if paths:
+        _in_background(discard, paths)
@@ -0,0 +1,136 @@
+"""Streaming image uploads with size limits.
+
+Files of one request are written concurrently in large chunks, hashed while
+they stream, recognised by their magic bytes and removed again if anything
+goes wrong, so no partial file stays behind. They land under temporary
+names, storage.add_all moves them to their content address.
+"""
+import asyncio
+import hashlib
+import os
+import uuid
+import aiofiles
+from fastapi import HTTPException, UploadFile
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+CHUNK_SIZE = 1024 * 1024
+MAX_FILE_SIZE = int(os.environ.get('UPLOAD_MAX_FILE_SIZE', 15 * 1024 * 1024))
+MAX_REQUEST_SIZE = int(os.environ.get('UPLOAD_MAX_REQUEST_SIZE', 100 * 1024 * 1024))
+
+SIGNATURES = {
+    b'\xff\xd8\xff': '.jpg',
+    b'\x89PNG\r\n\x1a\n': '.png',
+}
+
+
+class NotAnImage(HTTPException):
+    def __init__(self):
+        super().__init__(status_code=406, detail="Only .jpeg or .png  files allowed")
+
+
+class TooLarge(HTTPException):
+    def __init__(self, detail: str):
+        super().__init__(status_code=413, detail=detail)
+
+
+class Budget:
+    """Bytes left for all files of one request."""
+
+    def __init__(self, size: int):
+        self.left = size
+
+    def take(self, size: int):
+        self.left -= size
+        if self.left < 0:
+            raise TooLarge("Request is too large")
+
+
+def image_extension(head: bytes):
+    for signature, ext in SIGNATURES.items():
+        if head.startswith(signature):
+            return ext
+    return None
+
+
+def remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+async def save(file: UploadFile, directory: str, budget: Budget):
+    """Streams file into a temporary file in directory, returns its path and sha256."""
+    chunk = await file.read(CHUNK_SIZE)
+    ext = image_extension(chunk)
+    if ext is None:
+        raise NotAnImage()
+    path = directory + '.upload-' + uuid.uuid4().hex + ext
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(path, 'wb') as f:
+            while chunk:
+                size += len(chunk)
+                if size > MAX_FILE_SIZE:
+                    raise TooLarge(f"{file.filename} is larger than {MAX_FILE_SIZE} bytes")
+                budget.take(len(chunk))
+                digest.update(chunk)
+                await f.write(chunk)
+                chunk = await file.read(CHUNK_SIZE)
+    except BaseException:
+        remove(path)
+        raise
+    return path, digest.hexdigest()
+
+
+async def save_all(files: list, directory: str, skip_invalid: bool = False):
+    """Saves all files concurrently, nothing is kept if one of them fails.
+
+    With skip_invalid files that are not images are left out instead of
+    failing the whole request.
+    """
+    budget = Budget(MAX_REQUEST_SIZE)
+    results = await asyncio.gather(*[save(file, directory, budget) for file in files], return_exceptions=True)
+    saved = [result for result in results if not isinstance(result, BaseException)]
+    errors = [result for result in results if isinstance(result, BaseException) and not (skip_invalid and isinstance(result, NotAnImage))]
+    if errors:
+        for path, _ in saved:
+            remove(path)
+        raise errors[0]
+    return saved
+
+
+class LimitUploadSize:
+    """Rejects multipart bodies over MAX_REQUEST_SIZE before they are spooled to disk."""
+
+    def __init__(self, app: ASGIApp, max_size: int = MAX_REQUEST_SIZE):
+        self.app = app
+        self.max_size = max_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http' or scope['method'] not in ('POST', 'PUT'):
+            return await self.app(scope, receive, send)
+        headers = dict(scope['headers'])
+        if not headers.get(b'content-type', b'').startswith(b'multipart/'):
+            return await self.app(scope, receive, send)
+        # a little headroom for the multipart framing and form fields
+        limit = self.max_size + 64 * 1024
+        if int(headers.get(b'content-length', 0) or 0) > limit:
+            return await self._reject(send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            received += len(message.get('body', b''))
+            if received > limit:
+                raise TooLarge("Request is too large")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    async def _reject(self, send: Send):
+        await send({'type': 'http.response.start', 'status': 413, 'headers': [(b'content-type', b'application/json')]})
+        await send({'type': 'http.response.body', 'body': b'{"detail":"Request is too large"}'})
@@ -0,0 +1,55 @@
+"""Rows for tests, written straight to the database so setup issues no requests."""
+import io
+from datetime import date, datetime, timedelta
+from fastapi_jwt_auth import AuthJWT
+from PIL import Image
+import models, passwords
+
+PASSWORD = 'password'
+
+
+def user(db, username: str) -> int:
+    db_user = models.User(username=username, email=f'{username}@example.com', hashed_password=passwords.hash(PASSWORD))
+    db.add(db_user)
+    db.commit()
+    return db_user.id
+
+
+def auth(user_id: int) -> dict:
+    """Headers of a request made by the user; needs main imported for the JWT settings."""
+    return {'Authorization': f'Bearer {AuthJWT().create_access_token(subject=user_id)}'}
+
+
+def pet(db, owner_id: int, name: str = 'Rex', has_home: bool = True) -> int:
+    db_pet = models.Pet(name=name, description='good boy', sex='m', species='dog', birth_date=date(2020, 1, 1), has_home=has_home, owner_id=owner_id)
+    db.add(db_pet)
+    db.commit()
+    return db_pet.id
+
+
+def posts(db, pet_id: int, count: int = 1, start: datetime = datetime(2024, 1, 1)) -> list:
+    """Posts of the pet one minute apart, oldest first."""
+    db_posts = [models.Post(text=f'post {n}', owner_id=pet_id, images=[], time=start + timedelta(minutes=n)) for n in range(count)]
+    db.add_all(db_posts)
+    db.commit()
+    return [db_post.id for db_post in db_posts]
+
+
+def like(db, user_id: int, post_id: int):
+    db.add(models.Like(owner_id=user_id, post_id=post_id))
+    db.query(models.Post).filter(models.Post.id == post_id).update({models.Post.likes_count: models.Post.likes_count + 1, models.Post.time: models.Post.time}, synchronize_session=False)
+    db.commit()
+
+
+def comment(db, user_id: int, post_id: int, text: str = 'nice') -> int:
+    db_comment = models.Comment(owner_id=user_id, post_id=post_id, text=text)
+    db.add(db_comment)
+    db.query(models.Post).filter(models.Post.id == post_id).update({models.Post.comments_count: models.Post.comments_count + 1, models.Post.time: models.Post.time}, synchronize_session=False)
+    db.commit()
+    return db_comment.id
+
+
+def image(color: str = 'red') -> bytes:
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), color).save(buffer, 'JPEG')
+    return buffer.getvalue()
@@ -0,0 +1,48 @@
+"""Counters of posts stay exact when the same like or comment is removed twice at once."""
+import threading
+import crud, models, schemas
+from database import SessionLocal
+from tests import factories
+
+
+def twice_at_once(remove) -> list:
+    """Results of remove(session) in two sessions, the second running while the first has not committed."""
+    results = []
+    first, second = SessionLocal(), SessionLocal()
+    try:
+        # the first call's commit waits until the second one is blocked on the deleted row
+        first.commit = lambda: None
+        results.append(remove(first))
+        del first.commit
+        thread = threading.Thread(target=lambda: results.append(remove(second)))
+        thread.start()
+        thread.join(0.5)
+        first.commit()
+        thread.join()
+    finally:
+        first.close()
+        second.close()
+    return results
+
+
+def counts(db, post_id: int):
+    db.expire_all()
+    post = db.get(models.Post, post_id)
+    return post.likes_count, post.comments_count
+
+
+def test_concurrent_unlikes_decrement_once(db):
+    user_id = factories.user(db, 'ann')
+    [post_id] = factories.posts(db, factories.pet(db, user_id))
+    factories.like(db, user_id, post_id)
+    like = schemas.LikeCreate(owner_id=user_id, post_id=post_id)
+    assert twice_at_once(lambda session: crud.delete_like(session, like)) == ['ok', {'delete': 'not exist'}]
+    assert counts(db, post_id) == (0, 0)
+
+
+def test_concurrent_comment_deletes_decrement_once(db):
+    user_id = factories.user(db, 'ann')
+    [post_id] = factories.posts(db, factories.pet(db, user_id))
+    comment_id = factories.comment(db, user_id, post_id)
+    assert twice_at_once(lambda session: crud.delete_comment(session, comment_id)) == [{'delete': 'ok'}, {'delete': 'not exist'}]
+    assert counts(db, post_id) == (0, 0)
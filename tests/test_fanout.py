@@ -0,0 +1,87 @@
+"""Home feeds materialized on write match what they are built from."""
+from datetime import datetime, timedelta
+import crud, fanout, models
+from tests import factories
+
+
+def followed(db) -> dict:
+    """A pet of ann's with a post liked by bob and a shelter by cat, and dan who follows nothing."""
+    users = {name: factories.user(db, name) for name in ('ann', 'bob', 'cat', 'dan')}
+    pet_id = factories.pet(db, users['ann'])
+    [liked] = factories.posts(db, pet_id)
+    factories.like(db, users['bob'], liked)
+    db.add(models.Shelter(user_id=users['cat'], pet_id=pet_id))
+    db.commit()
+    return {'users': users, 'pet_id': pet_id}
+
+
+def fan_out_new(db, pet_id: int, count: int) -> list:
+    """New posts of the pet, each later than all before, copied into feeds."""
+    post_ids = factories.posts(db, pet_id, count, datetime(2024, 1, 1) + timedelta(days=db.query(models.Post).count()))
+    for post in db.query(models.Post).filter(models.Post.id.in_(post_ids)):
+        fanout.fan_out(db, post.id, pet_id, post.time)
+    return post_ids
+
+
+def feed_items(db) -> set:
+    return set(db.query(models.FeedItem.user_id, models.FeedItem.post_id, models.FeedItem.time))
+
+
+def test_fan_out_reaches_interested_users(db):
+    world = followed(db)
+    post_ids = fan_out_new(db, world['pet_id'], 3)
+    users = world['users']
+    assert {(user_id, post_id) for user_id, post_id, _ in feed_items(db)} == {(users[name], post_id) for name in ('ann', 'bob', 'cat') for post_id in post_ids}
+    assert [post['id'] for post in crud.get_feed(db, users['bob'])] == post_ids[::-1]
+    assert crud.get_feed(db, users['dan']) == []
+
+
+def test_deleted_post_leaves_no_feed_items(db):
+    world = followed(db)
+    post_ids = fan_out_new(db, world['pet_id'], 2)
+    crud.delete_post(db, post_ids[0])
+    assert {post_id for _, post_id, _ in feed_items(db)} == {post_ids[1]}
+
+
+def test_deleted_pet_leaves_no_feed_items(db):
+    world = followed(db)
+    fan_out_new(db, world['pet_id'], 2)
+    # a sheltered pet cannot be deleted
+    db.query(models.Shelter).delete()
+    db.commit()
+    crud.delete_pet(db, world['pet_id'])
+    assert feed_items(db) == set()
+
+
+def test_rebuild_matches_fan_out(db):
+    world = followed(db)
+    fan_out_new(db, world['pet_id'], 3)
+    # the liked post was created before any fan-out, deliver it too
+    [first] = db.query(models.Post).order_by(models.Post.id).limit(1)
+    fanout.fan_out(db, first.id, world['pet_id'], first.time)
+    incremental = feed_items(db)
+    fanout.rebuild(db)
+    assert feed_items(db) == incremental
+    fanout.rebuild(db, world['users']['bob'])
+    assert feed_items(db) == incremental
+
+
+def test_popular_pet_switches_to_feed_on_read(db, monkeypatch):
+    world = followed(db)
+    users = world['users']
+    [early] = fan_out_new(db, world['pet_id'], 1)
+    # ann, bob and cat are interested, one more than the limit allows
+    monkeypatch.setattr(fanout, 'FANOUT_LIMIT', 2)
+    [late] = fan_out_new(db, world['pet_id'], 1)
+    assert db.get(models.Pet, world['pet_id']).feed_on_read
+    assert feed_items(db) == set()
+    # readers merge the pet's posts in, old and new
+    for name in ('ann', 'bob', 'cat'):
+        assert [post['id'] for post in crud.get_feed(db, users[name])][:2] == [late, early]
+    assert crud.get_feed(db, users['dan']) == []
+    # a full rebuild under the limit goes back to fanning out
+    monkeypatch.setattr(fanout, 'FANOUT_LIMIT', 3)
+    fanout.rebuild(db)
+    db.expire_all()
+    assert not db.get(models.Pet, world['pet_id']).feed_on_read
+    assert {post_id for user_id, post_id, _ in feed_items(db) if user_id == users['bob']} >= {early, late}
@@ -0,0 +1,57 @@
+"""Invalidations published by one process evict the cache of another."""
+import multiprocessing
+import sys
+import time
+import cache, invalidation
+from database import SessionLocal
+
+KEY = ('post', 1)
+# not notified, a reconnect would clear it along with KEY
+KEPT = ('post', 2)
+TIMEOUT = 10
+
+
+def worker(ready):
+    """Another worker of the app: exits 0 once a notification evicted KEY and nothing else."""
+    listener = invalidation.Listener(poll_interval=0.1)
+    listener.start()
+    if not listener.listening.wait(TIMEOUT):
+        sys.exit(2)
+    cache.entities.set(KEY, {'id': 1})
+    cache.entities.set(KEPT, {'id': 2})
+    ready.set()
+    if not wait_for(lambda: cache.entities.get(KEY) is None):
+        sys.exit(1)
+    if cache.entities.get(KEPT) is None or not listener.listening.is_set():
+        sys.exit(3)
+    listener.stop()
+    sys.exit(0)
+
+
+def wait_for(condition, timeout: float = TIMEOUT, interval: float = 0.05) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(interval)
+    return True
+
+
+def test_commit_evicts_in_other_process():
+    context = multiprocessing.get_context('spawn')
+    ready = context.Event()
+    process = context.Process(target=worker, args=(ready,))
+    process.start()
+    try:
+        assert ready.wait(TIMEOUT), 'worker did not start listening'
+        db = SessionLocal()
+        try:
+            invalidation.invalidate(db, KEY)
+            db.commit()
+        finally:
+            db.close()
+        process.join(TIMEOUT)
+        assert process.exitcode == 0
+    finally:
+        if process.is_alive():
+            process.kill()
@@ -0,0 +1,12 @@
+"""The migrations build exactly the schema models.py describes."""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_models_match_migrations(schema):
+    # the schema fixture upgraded TEST_DATABASE_URL to head, which POSTGRES_DATABASE_URL points at
+    result = subprocess.run([sys.executable, os.path.join(ROOT, 'src', 'manage.py'), 'check-migrations'], cwd=ROOT, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
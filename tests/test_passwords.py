@@ -0,0 +1,36 @@
+"""Logins of unknown users do the same hashing work as wrong passwords."""
+import passwords
+from tests import factories
+
+
+def count_verifies(monkeypatch) -> list:
+    verified = []
+    hasher = passwords.hasher
+
+    class Spy:
+        def __getattr__(self, name):
+            return getattr(hasher, name)
+
+        def verify(self, hashed, password):
+            verified.append(hashed)
+            return hasher.verify(hashed, password)
+
+    # swap the module's hasher, PasswordHasher instances may not take new attributes
+    monkeypatch.setattr(passwords, 'hasher', Spy())
+    return verified
+
+
+def test_unknown_user_is_verified_against_dummy_hash(client, monkeypatch):
+    verified = count_verifies(monkeypatch)
+    response = client.post('/auth/login', json={'username': 'nobody', 'password': 'x'})
+    assert response.status_code == 401
+    assert verified == [passwords.DUMMY_HASH]
+
+
+def test_wrong_password_answers_like_unknown_user(client, db, monkeypatch):
+    factories.user(db, 'ann')
+    verified = count_verifies(monkeypatch)
+    wrong = client.post('/auth/login', json={'username': 'ann', 'password': 'wrong'})
+    unknown = client.post('/auth/login', json={'username': 'nobody', 'password': 'wrong'})
+    assert (wrong.status_code, wrong.json()) == (unknown.status_code, unknown.json())
+    assert len(verified) == 2
@@ -0,0 +1,77 @@
+"""Feed and post reads issue the same statements however many rows they return.
+
+Loading likes, comments or pets per post (N+1) makes the count grow with the
+page, which these tests catch before the budgets do.
+"""
+import pytest
+from sqlalchemy import event
+import cache, database, models
+from tests import factories
+
+
+@pytest.fixture
+def statements():
+    """Statements run on either engine by any thread while the test runs."""
+    issued = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        issued.append(statement)
+
+    engines = (database.engine, database.async_engine.sync_engine)
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', count)
+    yield issued
+    for engine in engines:
+        event.remove(engine, 'before_cursor_execute', count)
+
+
+def fill(db) -> dict:
+    """A user with one pet of 30 posts and 29 pets of one post, all liked, commented and in the feed."""
+    user_id = factories.user(db, 'ann')
+    pet_id = factories.pet(db, user_id)
+    post_ids = factories.posts(db, pet_id, 30)
+    for n in range(29):
+        post_ids += factories.posts(db, factories.pet(db, user_id, f'pet {n}'))
+    for post_id in post_ids:
+        factories.like(db, user_id, post_id)
+        factories.comment(db, user_id, post_id)
+    db.add_all([models.FeedItem(user_id=user_id, post_id=post.id, time=post.time) for post in db.query(models.Post)])
+    db.commit()
+    return {'user_id': user_id, 'pet_id': pet_id, 'post_id': post_ids[0]}
+
+
+READS = {
+    'posts': lambda ids: '/posts',
+    'pet posts': lambda ids: f"/pets/{ids['pet_id']}/posts",
+    'liked': lambda ids: '/posts/liked',
+    'feed': lambda ids: '/posts/feed',
+    'search': lambda ids: '/search?q=post',
+}
+
+
+def issued_by(client, statements, path: str, user_id: int, limit: int) -> int:
+    cache.entities.clear()
+    statements.clear()
+    response = client.get(path, params={'limit': limit}, headers=factories.auth(user_id))
+    assert response.status_code == 200, response.text
+    assert len(response.json()) == limit
+    return len(statements)
+
+
+@pytest.mark.parametrize('read', READS)
+def test_statements_do_not_grow_with_the_page(client, db, statements, read):
+    ids = fill(db)
+    path = READS[read](ids)
+    assert issued_by(client, statements, path, ids['user_id'], 30) == issued_by(client, statements, path, ids['user_id'], 1)
+
+
+def test_post_statements_do_not_grow_with_likes_and_comments(client, db, statements):
+    ids = fill(db)
+    [quiet] = factories.posts(db, ids['pet_id'])
+    counts = []
+    for post_id in (quiet, ids['post_id']):
+        cache.entities.clear()
+        statements.clear()
+        assert client.get(f'/posts/{post_id}', headers=factories.auth(ids['user_id'])).status_code == 200
+        counts.append(len(statements))
+    assert counts[0] == counts[1]
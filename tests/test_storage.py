@@ -0,0 +1,44 @@
+"""Blob references and files follow the transaction that writes them."""
+import hashlib
+import os
+import models, storage
+from tests import factories
+
+DIRECTORY = 'static/post_images/'
+
+
+def add(db, color: str = 'red') -> str:
+    """An uploaded image added in db's transaction, returns its public path."""
+    data = factories.image(color)
+    upload = f'{DIRECTORY}upload-{color}.jpg'
+    with open(upload, 'wb') as file:
+        file.write(data)
+    [public] = storage.add_all(db, DIRECTORY, [(upload, hashlib.sha256(data).hexdigest())])
+    return public
+
+
+def drain():
+    """Waits for the removals queued so far."""
+    storage.collector.submit(lambda: None).result()
+
+
+def test_rolled_back_add_leaves_nothing(db):
+    public = add(db)
+    assert os.path.exists(public.lstrip('/'))
+    db.rollback()
+    drain()
+    assert db.query(models.Blob).count() == 0
+    assert not os.path.exists(public.lstrip('/'))
+
+
+def test_committed_add_is_kept_until_released(db):
+    public = add(db)
+    db.commit()
+    drain()
+    assert db.get(models.Blob, public).refcount == 1
+    assert os.path.exists(public.lstrip('/'))
+    storage.release(db, [public])
+    db.commit()
+    drain()
+    assert db.query(models.Blob).count() == 0
+    assert not os.path.exists(public.lstrip('/'))
@@ -0,0 +1,21 @@
+"""Version bumps leave the rows' own data alone."""
+import crud, models, schemas
+from tests import factories
+
+
+def post_time(db, post_id: int):
+    db.expire_all()
+    return db.get(models.Post, post_id).time
+
+
+def test_likes_and_comments_keep_post_time(db):
+    user_id = factories.user(db, 'ann')
+    [post_id] = factories.posts(db, factories.pet(db, user_id))
+    time, version = post_time(db, post_id), db.get(models.Post, post_id).version
+    assert crud.create_like(db, schemas.LikeCreate(owner_id=user_id, post_id=post_id)) == 'ok'
+    assert post_time(db, post_id) == time
+    assert crud.delete_like(db, schemas.LikeCreate(owner_id=user_id, post_id=post_id)) == 'ok'
+    assert post_time(db, post_id) == time
+    crud.create_comment(db, schemas.CommentCreate(text='nice', owner_id=user_id, post_id=post_id))
+    assert post_time(db, post_id) == time
+    assert db.get(models.Post, post_id).version == version + 3